@@ -1 +1,6 @@
-from src.app import App
\ No newline at end of file
+def __getattr__(name: str):
+    # the GUI is imported on first use, so the command line (python -m src) starts without customtkinter and PIL
+    if name == "App":
+        from src.app import App
+        return App
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
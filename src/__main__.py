@@ -0,0 +1,118 @@
+import argparse, json, os, sys, time
+
+# constants
+FORMATS = ["wav", "flac"]
+POLL_SECONDS = 0.1 # how often play checks that the score is still playing
+
+def load_score(file_path: str, use_cache: bool = True) -> "tuple[dict, list]":
+    from src.compiler import compile_score
+    return compile_score(file_path, use_cache=use_cache)
+
+def get_context(args: argparse.Namespace):
+    """This picks the render context of the --preview and --rate options"""
+    from src.player import FINAL_CONTEXT, PREVIEW_CONTEXT, RenderContext
+    if args.preview:
+        return PREVIEW_CONTEXT
+    return RenderContext(args.rate) if args.rate else FINAL_CONTEXT
+
+## COMMANDS ##
+def compile_command(args: argparse.Namespace) -> int:
+    file_data, organum = load_score(args.score, not args.no_cache)
+
+    # the whole compiled score
+    if args.json:
+        output = open(args.output, "w") if args.output else sys.stdout
+        try:
+            json.dump({"file_data": file_data, "voices": organum}, output)
+            output.write("\n")
+        finally:
+            if output is not sys.stdout:
+                output.close()
+        return 0
+
+    # a summary of the score
+    print(f"title:    {file_data['title']}")
+    print(f"composer: {file_data['composer']}")
+    print(f"tuning:   {file_data['tuning'] or 'equal'}")
+    for voice, music in enumerate(organum):
+        notes = sum(len(chord) for chord in music)
+        seconds = sum(max(note["duration"] for note in chord) for chord in music if chord)
+        print(f"voice {voice + 1}:  {len(music)} chords, {notes} notes, {seconds:.1f}s")
+    return 0
+
+def render_command(args: argparse.Namespace) -> int:
+    from src.player import export
+    file_data, organum = load_score(args.score)
+    context = get_context(args)
+
+    output_path = args.output or f"{os.path.splitext(args.score)[0]}.{args.format}"
+    start = time.perf_counter()
+    samples = export(organum, output_path, context, subtype=args.subtype, workers=args.threads, tuning=file_data["tuning"])
+    elapsed = time.perf_counter() - start
+    print(f"rendered {args.score} -> {output_path} ({samples / context.rate:.1f}s audio in {elapsed:.2f}s)")
+    return 0
+
+def play_command(args: argparse.Namespace) -> int:
+    from src.player import play, position, stop
+    file_data, organum = load_score(args.score)
+    context = get_context(args)
+
+    # plays until the score ends or ctrl-c
+    play(organum, context=context, tuning=file_data["tuning"], start=int(args.start * context.rate))
+    try:
+        while position() is not None:
+            time.sleep(POLL_SECONDS)
+    except KeyboardInterrupt:
+        stop()
+        return 130
+    return 0
+
+def bench_command(args: argparse.Namespace) -> int:
+    from src.bench.__main__ import main as bench_main
+    return bench_main(args.arguments)
+
+## MAIN ##
+def main(argv: "list[str]" = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m src", description="Compile, render and play .organum scores without the editor.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    compile_parser = commands.add_parser("compile", help="compile a score and summarize it")
+    compile_parser.add_argument("score", help=".organum file")
+    compile_parser.add_argument("--json", action="store_true", help="print the compiled score as JSON")
+    compile_parser.add_argument("-o", "--output", help="write the JSON to a file instead of stdout")
+    compile_parser.add_argument("--no-cache", action="store_true", help="compile without the .organumc cache")
+    compile_parser.set_defaults(run=compile_command)
+
+    render_parser = commands.add_parser("render", help="render a score to an audio file")
+    render_parser.add_argument("score", help=".organum file")
+    render_parser.add_argument("-o", "--output", help="audio file (default: the score's name with the format's extension)")
+    render_parser.add_argument("-f", "--format", default="wav", choices=FORMATS, help="audio format when there is no --output (default: wav)")
+    render_parser.add_argument("--subtype", help="soundfile subtype such as PCM_16, PCM_24 or FLOAT (default: the format's default)")
+    render_parser.add_argument("-t", "--threads", type=int, default=None, help="threads rendering the voices (default: number of cores)")
+
+    play_parser = commands.add_parser("play", help="play a score on the default audio device")
+    play_parser.add_argument("score", help=".organum file")
+    play_parser.add_argument("-s", "--start", type=float, default=0, help="seconds into the score to start from (default: 0)")
+
+    for command_parser in (render_parser, play_parser):
+        command_parser.add_argument("-r", "--rate", type=int, default=None, help="sample rate (default: 44100)")
+        command_parser.add_argument("-p", "--preview", action="store_true", help="quick low quality render (11025 Hz, 16 bit)")
+    render_parser.set_defaults(run=render_command)
+    play_parser.set_defaults(run=play_command)
+
+    # the benchmark's own options are passed through (see python -m src.bench --help)
+    bench_parser = commands.add_parser("bench", help="time the compiler and renderer on a generated score", add_help=False)
+    bench_parser.set_defaults(run=bench_command)
+
+    args, arguments = parser.parse_known_args(argv)
+    if arguments and args.command != "bench":
+        parser.error(f"unrecognized arguments: {' '.join(arguments)}")
+    args.arguments = arguments
+    try:
+        return args.run(args)
+    except (OSError, ValueError) as error:
+        print(f"error: {error}", file=sys.stderr)
+        return 1
+
+if __name__ == "__main__":
+    sys.exit(main())
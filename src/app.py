@@ -1,5 +1,7 @@
 import customtkinter
 from src.views import FileTabs, UtilBar
+from src.views.assets import prewarm
+from src.worker import Worker
 
 class App(customtkinter.CTk):
     def __init__(self):
@@ -10,6 +12,9 @@ class App(customtkinter.CTk):
         self.grid_rowconfigure(1, weight=1)
         self.resizable(False, False)
 
+        # background compile and render jobs
+        self.worker = Worker(self)
+
         # util bar
         self.my_frame = UtilBar(master=self)
         self.my_frame.grid(row=0, column=0, padx=5, pady=5, sticky="nsew")
@@ -18,5 +23,13 @@ class App(customtkinter.CTk):
         self.tab_view = FileTabs(master=self)
         self.tab_view.grid(row=1, column=0, padx=5, pady=5, sticky="nsew")
 
-        # escape key
-        self.bind("<Escape>", lambda event: self.destroy())
\ No newline at end of file
+        # escape key and close button save the open files first
+        self.bind("<Escape>", lambda event: self.close())
+        self.protocol("WM_DELETE_WINDOW", self.close)
+
+        # decode the images of the Play and Help windows in the background
+        prewarm(self)
+
+    def close(self):
+        self.tab_view.flush_autosaves()
+        self.destroy()
\ No newline at end of file
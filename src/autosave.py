@@ -0,0 +1,99 @@
+import atexit, hashlib, logging, os, stat, tempfile, threading
+
+# constants
+AUTOSAVE_MS = int(os.environ.get("ORGANUM_AUTOSAVE_MS", 500)) # keystrokes within this window are saved together
+
+def content_hash(text: str) -> bytes:
+    return hashlib.blake2b(text.encode("utf-8", "surrogatepass"), digest_size=16).digest()
+
+class AutosaveWriter:
+    """This writes snapshots of files on a background thread, atomically and only when their content changed.
+    A snapshot replaces the one of the same file still waiting, so a burst of saves is a single write."""
+    def __init__(self):
+        self.pending = {} # path -> text waiting to be written
+        self.hashes = {} # path -> hash of the text on disk
+        self.busy = None # path being written
+        self.closed = False
+        self.condition = threading.Condition()
+
+        self.thread = threading.Thread(target=self.run, name="organum-autosave", daemon=True)
+        self.thread.start()
+        atexit.register(self.close) # no save is lost when the app exits
+
+    def remember(self, path: str, text: str) -> None:
+        """This records the text a file was loaded with, so saving it unchanged writes nothing"""
+        with self.condition:
+            self.hashes[path] = content_hash(text)
+
+    def save(self, path: str, text: str) -> None:
+        """This queues a snapshot of a file's text to be written"""
+        with self.condition:
+            if self.closed:
+                raise RuntimeError("autosave writer is closed")
+            self.pending[path] = text
+            self.condition.notify_all()
+
+    def flush(self, path: str = None, timeout: float = None) -> bool:
+        """This waits until the snapshots of a file (or of every file) are written
+
+        Returns:
+            bool: False if the timeout passed first
+        """
+        def waiting():
+            if path is None:
+                return bool(self.pending) or self.busy is not None
+            return path in self.pending or self.busy == path
+
+        with self.condition:
+            return self.condition.wait_for(lambda: not waiting(), timeout)
+
+    def close(self) -> None:
+        """This writes what is left and stops the thread"""
+        with self.condition:
+            if self.closed:
+                return
+            self.closed = True
+            self.condition.notify_all()
+        self.thread.join()
+
+    def run(self) -> None:
+        while True:
+            with self.condition:
+                self.condition.wait_for(lambda: self.pending or self.closed)
+                if not self.pending:
+                    return
+                path = next(iter(self.pending))
+                text = self.pending.pop(path)
+                self.busy = path
+
+            try:
+                self.write(path, text)
+            except OSError as error:
+                logging.error(f"could not save {path}: {error}")
+            finally:
+                with self.condition:
+                    self.busy = None
+                    self.condition.notify_all()
+
+    def write(self, path: str, text: str) -> None:
+        """This writes a file through a temporary file and a rename, so it is never left half written"""
+        digest = content_hash(text)
+        if self.hashes.get(path) == digest:
+            return
+
+        directory = os.path.dirname(path) or "."
+        descriptor, temp_path = tempfile.mkstemp(dir=directory, prefix=".", suffix=".tmp")
+        try:
+            with os.fdopen(descriptor, "w") as FILE:
+                FILE.write(text)
+            # keep the file's permissions (mkstemp makes it private)
+            if os.path.exists(path):
+                os.chmod(temp_path, stat.S_IMODE(os.stat(path).st_mode))
+            os.replace(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+            raise
+
+        with self.condition:
+            self.hashes[path] = digest
@@ -0,0 +1,130 @@
+import argparse, glob, os, sys, time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+# constants
+FORMATS = ["wav", "flac"]
+
+def find_scores(targets: "list[str]") -> "list[str]":
+    """This finds every .organum file in the given directories, globs or files
+
+    Args:
+        targets (list[str]): directories, glob patterns or files
+
+    Returns:
+        list[str]: sorted paths to the scores
+    """
+    paths = set()
+    for target in targets:
+        if os.path.isdir(target):
+            paths.update(glob.glob(os.path.join(target, "**", "*.organum"), recursive=True))
+        else:
+            paths.update(path for path in glob.glob(target, recursive=True) if os.path.isfile(path))
+    return sorted(paths)
+
+def output_names(file_paths: "list[str]") -> "dict[str, str]":
+    """This names the audio file of every score by its path relative to the directory the scores share,
+    so scores with the same file name in different directories do not overwrite each other
+
+    Args:
+        file_paths (list[str]): paths to the .organum files
+
+    Returns:
+        dict[str, str]: path of each score -> name of its audio file without the extension (ex. a/x)
+    """
+    if not file_paths:
+        return {}
+    root = os.path.commonpath([os.path.dirname(os.path.abspath(file_path)) for file_path in file_paths])
+    return {file_path: os.path.splitext(os.path.relpath(os.path.abspath(file_path), root))[0] for file_path in file_paths}
+
+def render_file(file_path: str, output_dir: str, audio_format: str = "wav", threads: int = 1, name: str = None) -> dict:
+    """This compiles and renders a single score to an audio file (runs in a worker process)
+
+    Args:
+        file_path (str): path to the .organum file
+        output_dir (str): directory for the audio file
+        audio_format (str, optional): "wav" or "flac". Defaults to "wav".
+        threads (int, optional): threads rendering the voices of the score. Defaults to 1.
+        name (str, optional): name of the audio file without the extension, may include directories. Defaults to the score's name.
+
+    Returns:
+        dict: the score, its audio file, seconds of audio and seconds spent
+    """
+    from src.compiler import compile_score
+    from src.player import SAMPLE_RATE, export
+
+    start = time.perf_counter()
+    file_data, organum = compile_score(file_path)
+
+    # written chunk by chunk, so long scores never sit in memory
+    name = name or os.path.splitext(os.path.basename(file_path))[0]
+    output_path = os.path.join(output_dir, f"{name}.{audio_format}")
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    samples = export(organum, output_path, workers=threads, tuning=file_data["tuning"])
+
+    return {
+        "path": file_path,
+        "output": output_path,
+        "audio_seconds": samples / SAMPLE_RATE,
+        "seconds": time.perf_counter() - start
+    }
+
+def render_batch(file_paths: "list[str]", output_dir: str, audio_format: str = "wav", workers: int = None, threads: int = 1) -> "tuple[list[dict], list[tuple]]":
+    """This renders many scores on a process pool and keeps going past scores that fail
+
+    Args:
+        file_paths (list[str]): paths to the .organum files
+        output_dir (str): directory for the audio files
+        audio_format (str, optional): "wav" or "flac". Defaults to "wav".
+        workers (int, optional): number of processes. Defaults to the number of cores.
+        threads (int, optional): threads rendering the voices of each score. Defaults to 1.
+
+    Returns:
+        tuple[list[dict], list[tuple]]: results of the rendered scores and (path, error) of the failed ones
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    workers = workers or os.cpu_count() or 1
+    results, errors = [], []
+    names = output_names(file_paths)
+
+    with ProcessPoolExecutor(max_workers=min(workers, max(len(file_paths), 1))) as pool:
+        futures = {pool.submit(render_file, file_path, output_dir, audio_format, threads, names[file_path]): file_path for file_path in file_paths}
+        for future in as_completed(futures):
+            try:
+                result = future.result()
+            except Exception as error:
+                errors.append((futures[future], error))
+                print(f"failed   {futures[future]}: {error}", file=sys.stderr)
+                continue
+            results.append(result)
+            print(f"rendered {result['path']} -> {result['output']} ({result['audio_seconds']:.1f}s audio in {result['seconds']:.2f}s)")
+
+    return results, errors
+
+## MAIN ##
+def main(argv: "list[str]" = None) -> int:
+    parser = argparse.ArgumentParser(description="Render a directory or glob of .organum scores to audio files.")
+    parser.add_argument("targets", nargs="+", help="directories, glob patterns or .organum files")
+    parser.add_argument("-o", "--output", default="renders", help="directory for the audio files (default: renders)")
+    parser.add_argument("-f", "--format", default="wav", choices=FORMATS, help="audio format (default: wav)")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="number of processes (default: number of cores)")
+    parser.add_argument("-t", "--threads", type=int, default=1, help="threads rendering the voices of each score (default: 1)")
+    args = parser.parse_args(argv)
+
+    file_paths = find_scores(args.targets)
+    if not file_paths:
+        print("no .organum files found", file=sys.stderr)
+        return 1
+
+    start = time.perf_counter()
+    results, errors = render_batch(file_paths, args.output, args.format, args.workers, args.threads)
+    elapsed = time.perf_counter() - start
+
+    # throughput report
+    audio_seconds = sum(result["audio_seconds"] for result in results)
+    print(f"{len(results)} rendered, {len(errors)} failed in {elapsed:.2f}s: "
+          f"{len(results) / elapsed:.2f} files/sec, {audio_seconds / elapsed:.1f} audio-seconds/sec")
+
+    return 1 if errors else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,2 @@
+from src.bench.generator import generate_score, write_score
+from src.bench.suite import compare, run_suite
@@ -0,0 +1,57 @@
+import argparse, json, sys
+from src.bench.suite import THRESHOLD, compare, load_report, run_suite, save_report
+
+def main(argv: "list[str]" = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m src.bench", description="Time the compiler and renderer on a generated score.")
+    parser.add_argument("--voices", type=int, default=4, help="number of voices (default: 4)")
+    parser.add_argument("--notes", type=int, default=1000, help="notes per voice (default: 1000)")
+    parser.add_argument("--chords", type=float, default=0.1, help="chance that an event is a chord (default: 0.1)")
+    parser.add_argument("--slurs", type=float, default=0.2, help="chance that a note is slurred (default: 0.2)")
+    parser.add_argument("--mutations", type=float, default=0.05, help="chance of a mutation change before an event (default: 0.05)")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the generator (default: 0)")
+    parser.add_argument("-r", "--repeat", type=int, default=3, help="timed runs per stage, the fastest is kept (default: 3)")
+    parser.add_argument("--no-memory", action="store_true", help="skip measuring peak memory")
+    parser.add_argument("-o", "--output", help="write the JSON report to a file instead of stdout")
+    parser.add_argument("-b", "--baseline", help="JSON report to compare against, exits with 1 on a slowdown")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD, help=f"relative slowdown flagged (default: {THRESHOLD})")
+    args = parser.parse_args(argv)
+
+    parameters = {
+        "voices": args.voices,
+        "notes": args.notes,
+        "chord_density": args.chords,
+        "slur_ratio": args.slurs,
+        "mutation_changes": args.mutations,
+        "seed": args.seed
+    }
+    # a baseline that can not be read fails before the suite runs
+    try:
+        baseline = load_report(args.baseline) if args.baseline else None
+    except (OSError, ValueError) as error:
+        print(f"error: {error}", file=sys.stderr)
+        return 1
+
+    report = run_suite(parameters, args.repeat, not args.no_memory)
+
+    if args.output:
+        save_report(report, args.output)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+    if baseline is None:
+        return 0
+
+    # slowdowns against the baseline (recorded with other parameters it can not be compared)
+    try:
+        comparisons = compare(report, baseline, args.threshold)
+    except (OSError, ValueError) as error:
+        print(f"error: {error}", file=sys.stderr)
+        return 1
+    for comparison in comparisons:
+        flag = "SLOWER" if comparison["slowdown"] else "ok"
+        print(f"{comparison['stage']:<18} {comparison['baseline']:.4f}s -> {comparison['seconds']:.4f}s ({comparison['ratio']:.2f}x) {flag}", file=sys.stderr)
+    return 1 if any(comparison["slowdown"] for comparison in comparisons) else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,69 @@
+import random
+
+# constants
+SYLLABLES = ["ut", "re", "mi", "fa", "sol", "la"]
+MUTATIONS = ["G", "c", "f", "g", "c'", "f'", "g'"]
+BEATS = ["", "", "", "4", "8", "16", "2", "4.", "8."] # mostly the current duration
+TOKENS_PER_LINE = 8
+
+def generate_score(voices: int = 4, notes: int = 1000, chord_density: float = 0.1, slur_ratio: float = 0.2,
+                   mutation_changes: float = 0.05, seed: int = 0) -> str:
+    """This generates the text of a random but valid .organum score, the same text for the same parameters
+
+    Args:
+        voices (int, optional): number of voices. Defaults to 4.
+        notes (int, optional): notes per voice (a chord counts each of its notes). Defaults to 1000.
+        chord_density (float, optional): chance that an event is a chord. Defaults to 0.1.
+        slur_ratio (float, optional): chance that a note is slurred to the next. Defaults to 0.2.
+        mutation_changes (float, optional): chance of a \\mutation command before an event. Defaults to 0.05.
+        seed (int, optional): seed of the generator. Defaults to 0.
+
+    Returns:
+        str: text of the score
+    """
+    rng = random.Random(seed)
+    lines = ["\\instruct {", f"    title: bench {voices}x{notes} seed {seed}", "    composer: generator", "}", "", "\\score {"]
+
+    for _ in range(voices):
+        lines += ["    \\voice {", f"        \\octave {rng.choice([-1, 0, 0, 1])}", f"        \\mutation {rng.choice(MUTATIONS)}"]
+        tokens = []
+        count = 0
+        while count < notes:
+            # hexachord change
+            if rng.random() < mutation_changes:
+                if tokens:
+                    lines.append("        " + " ".join(tokens))
+                    tokens = []
+                lines.append(f"        \\mutation {rng.choice(MUTATIONS)}")
+
+            # chord
+            if rng.random() < chord_density:
+                size = min(rng.randint(2, 3), notes - count) or 1
+                chord = [rng.choice(SYLLABLES) for _ in range(size)]
+                chord[0] += rng.choice(BEATS)
+                tokens.append("< " + " ".join(chord) + " >")
+                count += size
+            # note or rest
+            else:
+                token = rng.choice(SYLLABLES) if rng.random() > 0.05 else "-"
+                if token != "-" and rng.random() < slur_ratio:
+                    token += "+"
+                tokens.append(token + rng.choice(BEATS))
+                count += 1
+
+            if len(tokens) >= TOKENS_PER_LINE:
+                lines.append("        " + " ".join(tokens))
+                tokens = []
+
+        if tokens:
+            lines.append("        " + " ".join(tokens))
+        lines.append("    }")
+
+    lines.append("}")
+    return "\n".join(lines) + "\n"
+
+def write_score(file_path: str, **parameters) -> str:
+    """This writes a generated score (see generate_score) to a file and returns its path"""
+    with open(file_path, "w") as FILE:
+        FILE.write(generate_score(**parameters))
+    return file_path
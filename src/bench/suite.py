@@ -0,0 +1,140 @@
+import gc, json, os, platform, tempfile, time, tracemalloc
+import numpy as np
+
+# constants
+BENCH_VERSION = 1 # bump when the stages or their measurements change
+STAGES = ("compile_score", "music_to_waveform", "mix_waveforms", "render")
+THRESHOLD = 0.10 # slowdown flagged by compare
+
+def measure(function, repeat: int = 3, memory: bool = True) -> dict:
+    """This times a function, best of repeat runs, and measures its peak memory in one more run
+
+    Args:
+        function: called with no arguments
+        repeat (int, optional): timed runs. Defaults to 3.
+        memory (bool, optional): trace the peak memory (slows the run, so it is not timed). Defaults to True.
+
+    Returns:
+        dict: seconds of the fastest run, peak bytes (None without memory) and the last result
+    """
+    from src.player import WAVEFORM_CACHE
+    best = float("inf")
+    result = None
+    for _ in range(max(repeat, 1)):
+        # every run starts cold
+        WAVEFORM_CACHE.clear()
+        gc.collect()
+        start = time.perf_counter()
+        result = function()
+        best = min(best, time.perf_counter() - start)
+
+    peak = None
+    if memory:
+        WAVEFORM_CACHE.clear()
+        gc.collect()
+        tracemalloc.start()
+        try:
+            function()
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    return {"seconds": best, "peak_bytes": peak, "result": result}
+
+def run_suite(parameters: dict = None, repeat: int = 3, memory: bool = True) -> dict:
+    """This generates a score and times each hot path on it separately
+
+    Args:
+        parameters (dict, optional): parameters of generate_score. Defaults to its defaults.
+        repeat (int, optional): timed runs of each stage. Defaults to 3.
+        memory (bool, optional): measure the peak memory of each stage. Defaults to True.
+
+    Returns:
+        dict: the machine, the parameters and wall time, notes/sec, audio-seconds/sec and peak memory per stage
+    """
+    from src.bench.generator import generate_score
+    from src.compiler import compile_score
+    from src.player import SAMPLE_RATE, mix_waveforms, music_to_waveform, render
+
+    parameters = dict(parameters or {})
+    text = generate_score(**parameters)
+
+    # compile from a file without the .organumc cache
+    descriptor, path = tempfile.mkstemp(suffix=".organum")
+    try:
+        with os.fdopen(descriptor, "w") as FILE:
+            FILE.write(text)
+        stages = {"compile_score": measure(lambda: compile_score(path, use_cache=False), repeat, memory)}
+    finally:
+        os.unlink(path)
+
+    _, organum = stages["compile_score"]["result"]
+    stages["music_to_waveform"] = measure(lambda: [music_to_waveform(voice) for voice in organum], repeat, memory)
+    waveforms = stages["music_to_waveform"]["result"]
+    stages["mix_waveforms"] = measure(lambda: mix_waveforms(waveforms), repeat, memory)
+    stages["render"] = measure(lambda: render(organum), repeat, memory)
+
+    notes = sum(len(chord) for voice in organum for chord in voice)
+    audio_seconds = len(stages["render"]["result"]) / SAMPLE_RATE
+    results = {}
+    for stage in STAGES:
+        seconds = stages[stage]["seconds"]
+        results[stage] = {
+            "seconds": seconds,
+            "notes_per_second": notes / seconds if seconds else None,
+            "audio_seconds_per_second": audio_seconds / seconds if seconds else None,
+            "peak_bytes": stages[stage]["peak_bytes"]
+        }
+
+    return {
+        "version": BENCH_VERSION,
+        "machine": {
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "cpus": os.cpu_count()
+        },
+        "parameters": parameters,
+        "repeat": repeat,
+        "notes": notes,
+        "audio_seconds": audio_seconds,
+        "results": results
+    }
+
+def compare(report: dict, baseline: dict, threshold: float = THRESHOLD) -> "list[dict]":
+    """This compares the wall time of each stage with a baseline report
+
+    Args:
+        report (dict): report of run_suite
+        baseline (dict): stored report of run_suite with the same parameters
+        threshold (float, optional): relative slowdown that is flagged. Defaults to THRESHOLD.
+
+    Returns:
+        list[dict]: stage, baseline and current seconds, their ratio and whether it is a slowdown
+    """
+    if report.get("parameters") != baseline.get("parameters") or report.get("version") != baseline.get("version"):
+        raise ValueError("the baseline was measured with other parameters or another version of the suite")
+
+    comparisons = []
+    for stage, result in report["results"].items():
+        before = baseline["results"].get(stage)
+        if before is None:
+            continue
+        ratio = result["seconds"] / before["seconds"] if before["seconds"] else float("inf")
+        comparisons.append({
+            "stage": stage,
+            "baseline": before["seconds"],
+            "seconds": result["seconds"],
+            "ratio": ratio,
+            "slowdown": ratio > 1 + threshold
+        })
+    return comparisons
+
+def load_report(file_path: str) -> dict:
+    with open(file_path, "r") as FILE:
+        return json.load(FILE)
+
+def save_report(report: dict, file_path: str) -> None:
+    with open(file_path, "w") as FILE:
+        json.dump(report, FILE, indent=2)
+        FILE.write("\n")
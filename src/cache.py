@@ -0,0 +1,145 @@
+import hashlib, json, os, struct, tempfile
+import numpy as np
+from src.score import NOTE_DTYPE, ScoreArray
+
+# constants
+MAGIC = b"ORGANUMC"
+EXTENSION = ".organumc"
+HEADER = struct.Struct("<8sQ") # magic, header length
+ALIGNMENT = 8
+
+CACHE_DIR = os.environ.get("ORGANUM_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "organum"))
+CACHE_SIZE = int(os.environ.get("ORGANUM_CACHE_SIZE", 256 * 1024 * 1024)) # bytes
+CACHE_ENABLED = os.environ.get("ORGANUM_CACHE", "1") != "0"
+
+def cache_key(text: str, version: int) -> str:
+    """This makes the cache key for the text of a score compiled by a compiler version
+
+    Args:
+        text (str): text of the score
+        version (int): version of the compiler
+
+    Returns:
+        str: hex digest of the key
+    """
+    digest = hashlib.sha256(f"{version}\n".encode())
+    digest.update(text.encode("utf-8", "surrogatepass"))
+    return digest.hexdigest()
+
+def cache_path(key: str, cache_dir: str = None) -> str:
+    """This gives the path of a compiled score in the cache
+
+    Args:
+        key (str): cache key of the score
+        cache_dir (str, optional): cache directory. Defaults to CACHE_DIR.
+
+    Returns:
+        str: path to the .organumc file
+    """
+    return os.path.join(cache_dir or CACHE_DIR, key + EXTENSION)
+
+def write_compiled(path: str, file_data: dict, voices: "list[ScoreArray]", version: int) -> None:
+    """This writes a compiled score: a JSON header followed by the fixed width note records of each voice
+
+    Args:
+        path (str): path to the .organumc file
+        file_data (dict): the file's data
+        voices (list[ScoreArray]): columnar voices
+        version (int): version of the compiler
+    """
+    header = {"version": version, "file_data": file_data, "dtype": NOTE_DTYPE.descr, "voices": []}
+    offset = 0
+    for voice in voices:
+        header["voices"].append({"names": voice.names, "mutations": voice.mutations, "rate": voice.rate, "offset": offset, "count": len(voice)})
+        offset += voice.notes.nbytes
+
+    # pad the header so the records are aligned
+    header = json.dumps(header).encode()
+    header += b" " * (-(HEADER.size + len(header)) % ALIGNMENT)
+
+    # write to a temporary file and swap it in so readers never see a partial file
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    descriptor, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(descriptor, "wb") as FILE:
+            FILE.write(HEADER.pack(MAGIC, len(header)))
+            FILE.write(header)
+            for voice in voices:
+                FILE.write(np.ascontiguousarray(voice.notes, dtype=NOTE_DTYPE).tobytes())
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+def read_compiled(path: str, version: int) -> "tuple[dict, list[ScoreArray]] | None":
+    """This maps a compiled score without parsing it
+
+    Args:
+        path (str): path to the .organumc file
+        version (int): version of the compiler
+
+    Returns:
+        tuple[dict, list[ScoreArray]] | None: the file's data and memory mapped voices, None if missing or stale
+    """
+    try:
+        with open(path, "rb") as FILE:
+            magic, header_length = HEADER.unpack(FILE.read(HEADER.size))
+            header = json.loads(FILE.read(header_length))
+    except (OSError, ValueError, struct.error):
+        return None
+
+    # a truncated or damaged file is stale like any other, the score is compiled again
+    try:
+        # stale or foreign file
+        if magic != MAGIC or header.get("version") != version or np.dtype([tuple(field) for field in header["dtype"]]) != NOTE_DTYPE:
+            return None
+
+        start = HEADER.size + header_length
+        voices = []
+        for voice in header["voices"]:
+            if voice["count"]:
+                notes = np.memmap(path, dtype=NOTE_DTYPE, mode="r", offset=start + voice["offset"], shape=(voice["count"],))
+            else:
+                notes = np.zeros(0, dtype=NOTE_DTYPE)
+            voices.append(ScoreArray(notes, voice["names"], voice["mutations"], voice["rate"]))
+
+        return header["file_data"], voices
+    except (OSError, ValueError, KeyError, TypeError, AttributeError):
+        return None
+
+def touch(path: str) -> None:
+    """This marks a compiled score as recently used"""
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+
+def evict(cache_dir: str = None, max_size: int = None) -> None:
+    """This deletes the least recently used compiled scores until the cache fits its size
+
+    Args:
+        cache_dir (str, optional): cache directory. Defaults to CACHE_DIR.
+        max_size (int, optional): size cap in bytes. Defaults to CACHE_SIZE.
+    """
+    cache_dir = cache_dir or CACHE_DIR
+    max_size = CACHE_SIZE if max_size is None else max_size
+
+    entries = []
+    with os.scandir(cache_dir) as directory:
+        for entry in directory:
+            if entry.name.endswith(EXTENSION):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+    # oldest first
+    entries.sort()
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in entries:
+        if total <= max_size:
+            break
+        try:
+            os.unlink(path)
+            total -= size
+        except OSError:
+            pass
@@ -1,53 +1,376 @@
-import logging, re
+import gc, hashlib, logging, os, re
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Iterable, Iterator, TextIO
+from src import instrument
+from src.tuning import TUNINGS
 
 # constants
-INSTRUCT, SCORE, VOICE, OCTAVE, MUTATION, BPM = "instruct", "score", "voice", "octave", "mutation", "bpm"
+INSTRUCT, SCORE, VOICE, OCTAVE, MUTATION, BPM, TUNING = "instruct", "score", "voice", "octave", "mutation", "bpm", "tuning"
+NOTE, REST, CHORD = "note", "rest", "chord"
+COMPILER_VERSION = 2 # bump when the compiled output changes (invalidates the .organumc cache)
+FILE_DATA = ("title", "composer", TUNING)
 NOTES = ["ut", "re", "mi", "fa", "sol", "la", "ut+", "re+", "mi+", "fa+", "sol+", "la+", "-"]
 
+# lexer
+HAS_BEAT = re.compile("[0-9]")
+BEAT = re.compile(r"\d+")
+LEXEMES = {}
+LEXEME_CACHE_SIZE = 4096 # scores use a few hundred distinct tokens, the rest are typos kept from the editor
+
+# compiled blocks of compile_text: (text hash, octave, mutation, bpm, duration) -> (file data, voices, state)
+BLOCKS = OrderedDict()
+BLOCK_CACHE_SIZE = 256
+CACHED_STATE = ("mode", "octave", "mutation", "bpm", "duration")
+
 ## MAIN FUNCTION ##
-def compile_score(filepath: str) -> dict | list:
-    """This method will read a file by its path and return its data as dictionary and list."""
+@instrument.profiled("compile")
+def compile_score(filepath: str, use_cache: bool = None) -> dict | list:
+    """This method will read a file by its path and return its data as dictionary and list.
+    Compiled scores are kept in the .organumc cache (see src/cache.py) unless use_cache is False."""
+    from src import cache
+    if not (cache.CACHE_ENABLED if use_cache is None else use_cache):
+        voices = []
+        file_data = dict.fromkeys(FILE_DATA)
+        with paused_gc(), instrument.span("parse"):
+            collect_events(compile_score_iter(filepath), file_data, voices)
+        instrument.count_music(voices)
+        return file_data, voices
+
+    from src.score import arrays_to_organum
+    with open(filepath, "r") as MUSIC_FILE:
+        text = MUSIC_FILE.read()
+
+    # valid cache
+    with instrument.span("read cache"):
+        path = cache.cache_path(cache.cache_key(text, COMPILER_VERSION))
+        compiled = cache.read_compiled(path, COMPILER_VERSION)
+    if compiled is not None:
+        cache.touch(path)
+        file_data, arrays = compiled
+        with paused_gc(), instrument.span("to music"):
+            voices = arrays_to_organum(arrays)
+        instrument.count("cache_hits")
+        instrument.count_music(voices)
+        return file_data, voices
+
+    # missing or stale cache
+    file_data, voices = compile_text_to_cache(text, path)[:2]
+    return file_data, voices
+
+@instrument.profiled("compile")
+def compile_score_arrays(filepath: str) -> "tuple[dict, list]":
+    """This method will read a file by its path and return its data as dictionary and its voices as ScoreArrays.
+    The voices are memory mapped from the .organumc cache (see src/cache.py) when it is valid."""
+    from src import cache
+    with open(filepath, "r") as MUSIC_FILE:
+        text = MUSIC_FILE.read()
+
+    with instrument.span("read cache"):
+        path = cache.cache_path(cache.cache_key(text, COMPILER_VERSION))
+        compiled = cache.read_compiled(path, COMPILER_VERSION)
+    if compiled is not None:
+        cache.touch(path)
+        instrument.count("cache_hits")
+        return compiled
+
+    file_data, _, arrays = compile_text_to_cache(text, path)
+    return file_data, arrays
+
+def compile_text_to_cache(text: str, path: str) -> tuple:
+    """This method will compile the text of a score, write it to the .organumc cache and return its data, voices and ScoreArrays."""
+    from src import cache
+    from src.score import organum_to_arrays
     voices = []
-    file_data = {"title": None, "composer": None}
-
-    mode = None
-    octave = None
-    mutation = None
-    bpm = 120/60 # this is normalized
-    chords = []
-    duration = 1
-    voice = -1
-    start_chord = False
+    file_data = dict.fromkeys(FILE_DATA)
+
+    with paused_gc():
+        with instrument.span("parse"):
+            collect_events(compile_lines(text.split("\n")), file_data, voices)
+        with instrument.span("to arrays"):
+            arrays = organum_to_arrays(voices)
+    instrument.count("cache_misses")
+    instrument.count_music(voices)
+
+    # a cache that can not be written only costs speed
+    try:
+        with instrument.span("write cache"):
+            cache.write_compiled(path, file_data, arrays, COMPILER_VERSION)
+            cache.evict(os.path.dirname(path))
+    except OSError as error:
+        logging.warning(f"could not cache compiled score: {error}")
+
+    return file_data, voices, arrays
+
+@instrument.profiled("compile")
+def compile_text(text: str, positions: list = None, check=None) -> dict | list:
+    """This method will compile the text of a score (ex. the editor's buffer) and return its data as dictionary and list.
+    Each \\instruct and \\voice block is cached by its text, so only the blocks that changed are recompiled.
+    The source span of each chord is added to positions per voice when given (see compile_score_iter).
+    check is called after every block when given, raise from it to stop compiling (ex. Job.check)."""
+    voices = []
+    file_data = dict.fromkeys(FILE_DATA)
+    state = new_state()
+    line_offset = 0
+
+    with paused_gc():
+        for block in split_blocks(text.split("\n")):
+            # blocks can only be reused from the same octave, mutation, bpm and duration with no open chord
+            key = None
+            if not state["start_chord"] and not state["chords"]:
+                digest = hashlib.blake2b("\n".join(block).encode(), digest_size=16).digest()
+                key = (digest, state["octave"], state["mutation"], state["bpm"], state["duration"])
+
+            cached = BLOCKS.get(key) if key is not None else None
+            if cached is None:
+                block_data, block_voices, block_positions = {}, [], []
+                with instrument.span("parse"):
+                    collect_events(compile_lines(block, state), block_data, block_voices, block_positions)
+                cached = (block_data, block_voices, {name: state[name] for name in CACHED_STATE}, block_positions)
+                instrument.count("blocks_compiled")
+
+                # only cache blocks that end with no open chord
+                if key is not None and not state["start_chord"] and not state["chords"]:
+                    BLOCKS[key] = cached
+                    if len(BLOCKS) > BLOCK_CACHE_SIZE:
+                        BLOCKS.popitem(last=False)
+            else:
+                BLOCKS.move_to_end(key)
+                block_data, block_voices, exit_state, block_positions = cached
+                state.update(exit_state)
+                state["voice"] += len(block_voices)
+                instrument.count("blocks_reused")
+
+            # add the block to the score
+            file_data.update(block_data)
+            voices.extend(block_voices)
+            if positions is not None:
+                positions.extend([(line + line_offset, column, end_line + line_offset, end_column) for line, column, end_line, end_column in voice_positions]
+                                 for voice_positions in block_positions)
+            line_offset += len(block)
+            if check is not None: check()
+
+            # positions are relative to their block, so a chord still open moves up to be relative to the next one
+            if state["start_chord"] and state["chord_position"] is not None:
+                line, column = state["chord_position"]
+                state["chord_position"] = (line - len(block), column)
+
+    instrument.count_music(voices)
+    return file_data, voices
+
+def compile_score_iter(source: "str | TextIO") -> "Iterator[tuple]":
+    """This method will read a file by its path (or an open text stream) and yield its events as they are compiled.
+
+    events: (kind, voice, data, position)
+        (INSTRUCT, None, (key, value), position) for each line of an \\instruct block and each \\tuning command
+        (VOICE, voice, None, position) when a \\voice starts
+        (NOTE | REST | CHORD, voice, [notes], position) for each note, rest or chord of a voice
+    position: (line, column, end line, end column) of the event's span in the source, lines from 1 and columns from 0 like Tk
+    """
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, "r") as MUSIC_FILE:
+            yield from compile_lines(MUSIC_FILE)
+    else:
+        yield from compile_lines(source)
+
+def compile_lines(lines: "Iterable[str]", state: dict = None) -> "Iterator[tuple]":
+    """This method will compile the lines of a score in one pass and yield its events (see compile_score_iter).
+    Compiling starts from state (see new_state) and leaves the final state in it once all events are read.
+    Notes are shared between identical notes, so treat them as read only."""
+    if state is None: state = new_state()
+    mode = state["mode"]
+    octave = state["octave"]
+    mutation = state["mutation"]
+    bpm = state["bpm"]
+    chords = state["chords"]
+    duration = state["duration"]
+    voice = state["voice"]
+    start_chord = state["start_chord"]
+    chord_position = state["chord_position"]
     end_chord = False
 
-    with open(filepath, "r") as MUSIC_FILE:
-        for line in MUSIC_FILE.readlines():
-            # clean line for algorithm
-            line = line.strip()
-            if not line or line == "}" or line[0] == "#":
-                continue
-            tokens = line.split(" ")
+    # caches for the current octave, mutation and bpm (cleared on every command)
+    lexemes = LEXEMES
+    durations = {}
+    notes_by_duration = {}
+    notes = notes_by_duration[duration] = {}
+
+    for line_number, source_line in enumerate(lines, 1):
+        # clean line for algorithm
+        line = source_line.strip()
+        if not line or line == "}" or line[0] == "#":
+            continue
+        tokens = line.split(" ")
+        if "" in tokens:
             tokens = [token for token in tokens if token]
+        columns = None # found when the line has its first event
 
+        # mode change
+        if line[0] == "\\":
+            mode, octave, mutation, bpm, new_voice = change_mode(mode, tokens, octave, mutation, bpm, voice)
+            durations.clear()
+            notes_by_duration.clear()
+            notes = notes_by_duration[duration] = {}
+            # error detected
+            if mode == None: 
+                logging.error("mode not found")
+            # tuning of the score
+            elif tokens[0] == "\\" + TUNING:
+                tuning = parse_tuning(tokens)
+                if tuning is not None:
+                    yield (INSTRUCT, None, (TUNING, tuning), line_span(line_number, source_line, line))
+            # new voice
+            if new_voice != voice:
+                voice = new_voice
+                yield (VOICE, voice, None, line_span(line_number, source_line, line))
+            continue
+
+        # process mode
+        if mode == INSTRUCT:
+            yield (INSTRUCT, None, parse_file_data(tokens), line_span(line_number, source_line, line))
+            continue
+        elif mode != VOICE:
+            continue
 
-            # mode change
-            if tokens[0].startswith("\\"):
-                mode, octave, mutation, bpm, voice = change_mode(mode, tokens, voices, octave, mutation, bpm, voice)
-                # error detected
-                if mode == None: 
-                    logging.error("mode not found")
+        # go through the notes
+        for index, token in enumerate(tokens):
+            lexeme = lexemes.get(token) or lex_token(token)
+
+            # plain note outside of a chord (most tokens)
+            if lexeme[6] and not start_chord:
+                note_info = notes.get(token)
+                if note_info is None:
+                    note_info = notes[token] = parse_note(token, duration, octave, mutation)
+                if columns is None: columns = token_columns(source_line, tokens)
+                yield (lexeme[6], voice, [note_info], (line_number, columns[index], line_number, columns[index] + len(token)))
                 continue
-            
-            # process mode
-            if mode == INSTRUCT:
-                update_file_data(tokens, file_data)
-            elif mode == VOICE:
-                duration, chords, start_chord, end_chord = update_voices(tokens, voices[voice], octave, mutation, bpm, duration, chords, start_chord, end_chord)
 
-    return file_data, voices
+            opens, closes, beat, dots, note, is_note, _ = lexeme
+
+            # check for the start and end of a chord
+            if opens:
+                start_chord = True
+                if columns is None: columns = token_columns(source_line, tokens)
+                chord_position = (line_number, columns[index])
+            if closes: end_chord = True
+
+            # change the duration
+            if beat is not None:
+                new_duration = durations.get(lexeme)
+                if new_duration is None:
+                    new_duration = durations[lexeme] = get_duration(beat, dots, bpm)
+                if new_duration != duration:
+                    duration = new_duration
+                    notes = notes_by_duration.get(duration)
+                    if notes is None:
+                        notes = notes_by_duration[duration] = {}
+
+            if not is_note and not end_chord:
+                continue
+
+            # create note (shared while the duration, octave and mutation hold)
+            note_info = notes.get(note)
+            if note_info is None and note:
+                note_info = notes[note] = parse_note(note, duration, octave, mutation)
+
+            # single note outside of a chord
+            if not start_chord:
+                if note_info is not None:
+                    if columns is None: columns = token_columns(source_line, tokens)
+                    yield (REST if note == "-" else NOTE, voice, [note_info], (line_number, columns[index], line_number, columns[index] + len(token)))
+                end_chord = False
+                continue
+
+            # add to chords and skip if we are in the middle of a chord
+            if note_info is not None:
+                chords.append(note_info)
+            if not end_chord:
+                continue
+
+            # hand over the chord and start a new one
+            if chords:
+                if columns is None: columns = token_columns(source_line, tokens)
+                yield (CHORD, voice, chords, (*chord_position, line_number, columns[index] + len(token)))
+                chords = []
+
+            start_chord = False
+            end_chord = False
+
+    state.update(mode=mode, octave=octave, mutation=mutation, bpm=bpm, chords=chords, duration=duration, voice=voice, start_chord=start_chord,
+                 chord_position=chord_position)
 
 ## HELPER FUNCTION ##
-def change_mode(mode: str, tokens: list, voices: list, octave: int, mutation: str, bpm: int, voice: int) -> tuple:
+def new_state() -> dict:
+    """This makes the compiler's state at the start of a score."""
+    return {
+        "mode": None,
+        "octave": None,
+        "mutation": None,
+        "bpm": 120/60, # this is normalized
+        "chords": [],
+        "duration": 1,
+        "voice": -1,
+        "start_chord": False,
+        "chord_position": None
+    }
+
+def collect_events(events: "Iterable[tuple]", file_data: dict, voices: list, positions: list = None, line_offset: int = 0) -> None:
+    """This method collects compiled events into the file's data and its voices.
+    The source span of each chord is collected into positions per voice when given, lines moved down by line_offset."""
+    for kind, _, data, position in events:
+        if kind == VOICE:
+            voice_data = []
+            voices.append(voice_data)
+            if positions is not None:
+                voice_positions = []
+                positions.append(voice_positions)
+        elif kind == INSTRUCT:
+            key, value = data
+            if key in FILE_DATA:
+                file_data[key] = value
+        else:
+            voice_data.append(data)
+            if positions is not None:
+                line, column, end_line, end_column = position
+                voice_positions.append((line + line_offset, column, end_line + line_offset, end_column))
+
+def line_span(line_number: int, line: str, stripped: str) -> tuple:
+    """This method gives the span of a line without its surrounding whitespace."""
+    column = len(line) - len(line.lstrip())
+    return (line_number, column, line_number, column + len(stripped))
+
+def token_columns(line: str, tokens: "list[str]") -> "list[int]":
+    """This method finds the column of each token of a line."""
+    columns = []
+    column = 0
+    for token in tokens:
+        column = line.index(token, column)
+        columns.append(column)
+        column += len(token)
+    return columns
+
+def split_blocks(lines: "list[str]") -> "Iterator[list[str]]":
+    """This method splits the lines of a score at each mode change (\\instruct, \\score, \\voice ...)."""
+    block = []
+    for line in lines:
+        stripped = line.strip()
+        if stripped[:1] == "\\" and stripped.split(" ")[0].split("\\")[1].strip() not in (OCTAVE, MUTATION, BPM, TUNING):
+            yield block
+            block = []
+        block.append(line)
+    yield block
+
+@contextmanager
+def paused_gc() -> "Iterator[None]":
+    """The score is made of many small containers, so this pauses the garbage collector while building it."""
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if gc_enabled: gc.enable()
+
+def change_mode(mode: str, tokens: list, octave: int, mutation: str, bpm: int, voice: int) -> tuple:
     """This method reads when a mode change occurs."""
     # get token and compare
     command = tokens[0].split("\\")[1].strip()
@@ -57,77 +380,69 @@ def change_mode(mode: str, tokens: list, voices: list, octave: int, mutation: st
     elif command == SCORE: return (SCORE, octave, mutation, bpm, voice)
     elif command == VOICE:
         voice += 1
-        voices.append([])
         return (VOICE, octave, mutation, bpm, voice)
     elif command == OCTAVE: return (mode, int(tokens[1]), mutation, bpm, voice)
     elif command == MUTATION: return (mode, octave, str(tokens[1]), bpm, voice)
     elif command == BPM: return (mode, octave, mutation, int(tokens[1])/60, voice)
+    elif command == TUNING: return (mode, octave, mutation, bpm, voice)
     
     # mode note found
     return (None, octave, mutation, bpm, voice)
 
-def update_file_data(tokens: "list[str]", file_data: dict) -> None:
-    """This method reads when to update the file's data."""
+def parse_file_data(tokens: "list[str]") -> tuple:
+    """This method reads a line of the file's data as a key and value."""
     key = tokens[0].rstrip(":")
     value = " ".join(tokens[1:]).strip()
-    if key in file_data:
-        file_data[key] = value
-
-def update_voices(tokens:"list[str]", voice_data: "list[dict]", octave: int, mutation: str, bpm: int, duration: int, chords: list, start_chord: bool, end_chord: bool) -> int | list:
-    """This method will transpose each note to readable notes for the player."""
-
-    # go through the notes
-    for note in tokens:
-        # check for the start of a chord
-        if note.count("<") > 0:
-            note = note.replace("<", "")
-            start_chord = True
-
-        if note.count(">") > 0:
-            note = note.replace(">", "")
-            end_chord = True
+    return key, value
 
-        # check if note has beats and change the duration
-        if re.search("[0-9]", note):
-            # count dots & remove
-            num_dots = note.count(".")
-            if num_dots > 0: note = note.replace("." * num_dots, "")
+def parse_tuning(tokens: "list[str]") -> str | None:
+    """This method reads the tuning system of a \\tuning command (see src/tuning.py)."""
+    tuning = tokens[1].lower() if len(tokens) > 1 else None
+    if tuning not in TUNINGS:
+        logging.error(f"tuning not found, expected one of {', '.join(TUNINGS)}")
+        return None
+    return tuning
 
-            # get beat & remove
-            duration = int(re.findall(r'\d+', note)[0])
-            if duration > 0: note = note.replace(str(duration), "")
+def lex_token(token: str) -> tuple:
+    """This breaks a token into its chord brackets, beat, dots and note. Results are cached per token.
 
-            # normalize duration
-            duration = 1 / duration * 4
+    lexeme: (opens chord, closes chord, beat, dots, note, is a note, event kind if it is a plain note)
+    """
+    opens = "<" in token
+    closes = ">" in token
+    note = token.replace("<", "").replace(">", "")
+    beat, dots = None, 0
 
-            # take into account bpm
-            duration /= bpm
+    # check if note has beats (ex. sol+8.)
+    if HAS_BEAT.search(note):
+        # count dots & remove
+        dots = note.count(".")
+        if dots > 0: note = note.replace("." * dots, "")
 
-            # calculate beat
-            for _ in range(num_dots):  duration += duration / 2
+        # get beat & remove
+        beat = int(BEAT.findall(note)[0])
+        if beat > 0: note = note.replace(str(beat), "")
 
-        if note not in NOTES and not end_chord:
-            continue
-
-        # create note and add to chords
-        if note:
-            note_info = parse_note(note, duration, octave, mutation)
-            chords.append(note_info)
-        
-        # skip if we are in the middle of a chord
-        if start_chord and not end_chord:
-            continue
+    is_note = note in NOTES
+    plain = (REST if note == "-" else NOTE) if is_note and note == token else None
+    lexeme = (opens, closes, beat, dots, note, is_note, plain)
+    if len(LEXEMES) >= LEXEME_CACHE_SIZE:
+        LEXEMES.clear()
+    LEXEMES[token] = lexeme
+    return lexeme
 
-        if chords[-1] == " ": del chords[-1]
+def get_duration(beat: int, dots: int, bpm: float) -> float:
+    """This turns a beat and its dots into a duration in seconds."""
+    # normalize duration
+    duration = 1 / beat * 4
 
-        # add chord to voice data and clear
-        voice_data.append(chords.copy())
-        chords.clear()
+    # take into account bpm
+    duration /= bpm
 
-        start_chord = False
-        end_chord = False
+    # calculate beat
+    for _ in range(dots):  duration += duration / 2
 
-    return duration, chords, start_chord, end_chord
+    return duration
 
 def parse_note(note: str, duration: float, octave: int, mutation: str) -> dict:
     """This puts together a dictionary to house the transposed notes."""
@@ -0,0 +1,244 @@
+import contextvars, functools, json, logging, os, tempfile, threading, time
+from contextlib import nullcontext
+from typing import Callable
+
+# constants
+FORMATS = ("json", "trace")
+PROFILE = os.environ.get("ORGANUM_PROFILE", "") # "json", "trace" or "json,trace", empty or "0" to disable
+PROFILE_DIR = os.environ.get("ORGANUM_PROFILE_DIR", os.path.join(tempfile.gettempdir(), "organum-profiles"))
+NULL = nullcontext() # what span and session give while disabled
+
+# state
+formats = tuple(name for name in PROFILE.split(",") if name in FORMATS) if PROFILE not in ("", "0") else ()
+directory = PROFILE_DIR
+enabled = bool(formats)
+current = contextvars.ContextVar("organum_profile_session", default=None) # session being recorded by this thread (see bind)
+last_report = None # report of the last session
+lock = threading.Lock()
+sessions = 0
+
+class Session:
+    """This records the stages, counters and cache hit rates of one compile, render or play"""
+    def __init__(self, name: str, caches: "dict | Callable[[], dict]" = None):
+        self.name = name
+        self.caches = (caches() if callable(caches) else caches) or {}
+        self.timers = {} # stage -> [calls, seconds]
+        self.counters = {}
+        self.events = [] # (stage, start, end, thread)
+        self.start = self.end = None
+        self.cache_start = {}
+        self.token = None
+        self.detached = False
+
+    def __enter__(self) -> "Session":
+        self.cache_start = {name: (cache.hits, cache.misses) for name, cache in self.caches.items()}
+        self.token = current.set(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        current.reset(self.token)
+        if not self.detached:
+            self.close()
+
+    def detach(self) -> None:
+        """This keeps the session recording after its with block ends, until close() (ex. the streamed blocks of a play)"""
+        self.detached = True
+
+    def close(self) -> None:
+        """This ends the session and writes its report (only the first call does, so it can be called from any thread)"""
+        global last_report
+        with lock:
+            if self.end is not None:
+                return
+            self.end = time.perf_counter()
+        self.add(self.name, self.start, self.end)
+        last_report = self.report()
+        dump(self)
+
+    def add(self, stage: str, start: float, end: float) -> None:
+        with lock:
+            timer = self.timers.setdefault(stage, [0, 0.0])
+            timer[0] += 1
+            timer[1] += end - start
+            self.events.append((stage, start, end, threading.get_ident()))
+
+    def count(self, name: str, amount: int = 1) -> None:
+        with lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def report(self) -> dict:
+        """This gives the session's seconds and calls per stage, counters and cache hits as a JSON ready dictionary"""
+        caches = {}
+        for name, cache in self.caches.items():
+            hits, misses = cache.hits - self.cache_start[name][0], cache.misses - self.cache_start[name][1]
+            caches[name] = {"hits": hits, "misses": misses, "hit_rate": hits / (hits + misses) if hits + misses else None}
+
+        return {
+            "session": self.name,
+            "seconds": self.end - self.start,
+            "stages": {stage: {"calls": calls, "seconds": seconds} for stage, (calls, seconds) in self.timers.items()},
+            "counters": dict(self.counters),
+            "caches": caches
+        }
+
+    def trace(self) -> dict:
+        """This gives the session's stages as Chrome trace events (open in chrome://tracing or Perfetto)"""
+        process = os.getpid()
+        events = [{
+            "name": stage,
+            "cat": self.name,
+            "ph": "X",
+            "ts": (start - self.start) * 1e6,
+            "dur": (end - start) * 1e6,
+            "pid": process,
+            "tid": thread
+        } for stage, start, end, thread in self.events]
+        events.append({"name": "counters", "cat": self.name, "ph": "C", "ts": (self.end - self.start) * 1e6, "pid": process, "args": self.counters})
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+class Span:
+    """This times a stage of the session being recorded"""
+    __slots__ = ("session", "stage", "start")
+
+    def __init__(self, session: Session, stage: str):
+        self.session = session
+        self.stage = stage
+
+    def __enter__(self) -> "Span":
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.session.add(self.stage, self.start, time.perf_counter())
+
+## API ##
+def enable(*names: str, output_dir: str = None) -> None:
+    """This turns recording on, dumping each session in the given formats ("json", "trace") to output_dir
+
+    Args:
+        names (str): formats of the dumps. Defaults to "json".
+        output_dir (str, optional): directory of the dumps. Defaults to ORGANUM_PROFILE_DIR or the temporary directory.
+    """
+    global enabled, formats, directory
+    unknown = set(names) - set(FORMATS)
+    if unknown:
+        raise ValueError(f"unknown profile format {', '.join(sorted(unknown))}, expected {' or '.join(FORMATS)}")
+    formats = names or ("json",)
+    directory = output_dir or directory
+    enabled = True
+
+def disable() -> None:
+    global enabled
+    enabled = False
+
+def session(name: str, caches: "dict | Callable[[], dict]" = None):
+    """This records a compile, render or play (a span of the session already being recorded)
+
+    Args:
+        name (str): name of the session and its dumps
+        caches (dict | Callable[[], dict], optional): caches with hits and misses counters (see WaveformCache) by name,
+            or a function giving them. Defaults to None.
+    """
+    if not enabled:
+        return NULL
+    recording = current.get()
+    if recording is not None:
+        return Span(recording, name)
+    return Session(name, caches)
+
+def profiled(name: str, caches: "dict | Callable[[], dict]" = None):
+    """This decorator records every call of a function as a session (see session)"""
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not enabled:
+                return function(*args, **kwargs)
+            with session(name, caches):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def recording() -> "Session | None":
+    """This gives the session this thread is recording, None when there is none"""
+    return current.get()
+
+def bind(function, session: Session = None):
+    """This makes a function record into a session from whatever thread runs it (ex. a thread pool or an audio callback)
+
+    Args:
+        function (callable): function to run
+        session (Session, optional): session to record into. Defaults to the session this thread is recording.
+    """
+    session = session or current.get()
+    if session is None:
+        return function
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        token = current.set(session)
+        try:
+            return function(*args, **kwargs)
+        finally:
+            current.reset(token)
+    return wrapper
+
+def span(stage: str):
+    """This times a stage of the session being recorded"""
+    session = current.get()
+    if session is None:
+        return NULL
+    return Span(session, stage)
+
+def count(name: str, amount: int = 1) -> None:
+    session = current.get()
+    if session is not None:
+        session.count(name, amount)
+
+def allocated(nbytes: int) -> None:
+    """This counts bytes allocated for waveforms"""
+    session = current.get()
+    if session is not None:
+        session.count("waveform_bytes", nbytes)
+
+def count_music(organum: list) -> None:
+    """This counts the notes, chords, slurs and rests of compiled voices"""
+    session = current.get()
+    if session is None:
+        return
+
+    notes = chords = slurs = rests = 0
+    for voice in organum:
+        for chord in voice:
+            if len(chord) > 1:
+                chords += 1
+            for note in chord:
+                if note["type"] == "rest":
+                    rests += 1
+                else:
+                    notes += 1
+                    if note["note"][-1] == "+":
+                        slurs += 1
+    for name, amount in (("voices", len(organum)), ("notes", notes), ("chords", chords), ("slurs", slurs), ("rests", rests)):
+        session.count(name, amount)
+
+def dump(session: Session) -> None:
+    """This writes the session's JSON report and/or Chrome trace to the profile directory"""
+    global sessions
+    # sessions end on the Tk, worker and audio threads, so each takes its own number
+    with lock:
+        sessions += 1
+        number = sessions
+    stamp = f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{number}"
+
+    # a profile that can not be written must not break the compile or play
+    try:
+        os.makedirs(directory, exist_ok=True)
+        if "json" in formats:
+            with open(os.path.join(directory, f"{session.name}-{stamp}.json"), "w") as FILE:
+                json.dump(session.report(), FILE, indent=2)
+        if "trace" in formats:
+            with open(os.path.join(directory, f"{session.name}-{stamp}.trace.json"), "w") as FILE:
+                json.dump(session.trace(), FILE)
+    except OSError as error:
+        logging.warning(f"could not write profile: {error}")
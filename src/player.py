@@ -1,19 +1,52 @@
+import os, threading
 import numpy as np
-import sounddevice as sd
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Iterator
+from src import instrument
+from src.score import SAMPLE_RATE, ScoreArray
+from src.tuning import EQUAL, frequency, iter_music_frequencies
+
+## RENDER CONTEXT ##
+class RenderContext:
+    """This holds the settings every stage of a render uses: the sample rate and the sample type of the output"""
+    __slots__ = ("rate", "dtype")
+
+    def __init__(self, rate: int = SAMPLE_RATE, dtype: str = "float32"):
+        if dtype not in ("float32", "int16"):
+            raise ValueError(f"unsupported sample type {dtype!r}, expected 'float32' or 'int16'")
+        self.rate = int(rate)
+        self.dtype = dtype
+
+    def __repr__(self) -> str:
+        return f"RenderContext(rate={self.rate}, dtype={self.dtype!r})"
+
+    def convert(self, waveform: np.ndarray) -> np.ndarray:
+        """This converts a float32 waveform to the output sample type"""
+        if self.dtype == "int16":
+            return (np.clip(waveform, -1, 1) * 32767).astype(np.int16)
+        return waveform
+
+# final renders at full quality, previews at a quarter of the samples for quick auditioning
+FINAL_CONTEXT = RenderContext(SAMPLE_RATE)
+PREVIEW_CONTEXT = RenderContext(11025, "int16")
 
 ## WAVEFORM GENERATION AND ALTERATIONS ##
-def fade_waveform(waveform: np.float32) -> np.float32:
+def fade_waveform(waveform: np.float32, rate: int = SAMPLE_RATE) -> np.float32:
     """This takes a waveform and adds fades to make the note more fluid
 
     Args:
         waveform (np.float32): waveform for current note
+        rate (int, optional): sample rate. Defaults to SAMPLE_RATE.
 
     Returns:
         np.float32: this is the new waveform with fade applied
     """
     # fade length based on duration
     duration = 0.02
-    fade_length = int(44100 * duration)
+    fade_length = int(rate * duration)
 
     # creates the fade length ; [start / stop] values
     fade_in = np.linspace(0, 1, fade_length)
@@ -25,17 +58,17 @@ def fade_waveform(waveform: np.float32) -> np.float32:
 
     return waveform
 
-def add_slur(waveform1: np.float32, waveform2: np.float32) -> np.float32:
+def add_slur(waveform1: np.float32, waveform2: np.float32, rate: int = SAMPLE_RATE) -> np.float32:
     """This takes two waveforms and adds a slur by pitch translation
 
     Args:
         waveform1 (np.float32): this first waveform
         waveform2 (np.float32): this second waveform
+        rate (int, optional): sample rate. Defaults to SAMPLE_RATE.
 
     Returns:
         np.float32: this is the new waveform with fade applied
     """
-    rate = 44100  # Sample rate
     transition_samples = int(rate * 0.02)  # Number of samples over which to transition
 
     # Create transition window
@@ -64,176 +97,965 @@ def mix_waveforms(waveforms: "list[np.ndarray]") -> np.ndarray:
     """
     max_len = max(len(waveform) for waveform in waveforms) if len(waveforms) > 0 else len(waveforms)
 
-    # array of zeros of the maximum length for the mixed audio
-    mixed_audio = np.zeros(max_len, dtype=np.float32)
-
-    # pad each waveform to the max length for safety and add it to the mixed_audio
-    for waveform in waveforms:
-        padded_waveform = np.pad(waveform, (0, max_len - len(waveform)), mode='constant')
-        mixed_audio += padded_waveform
+    # add each waveform in place at the start of one buffer, then scale down by the number of waveforms
+    bus = MixBus(len(waveforms))
+    mixed_audio = bus.allocate(max_len)
+    for voice, waveform in enumerate(waveforms):
+        bus.add(mixed_audio, voice, waveform)
+    return bus.finish(mixed_audio)
 
-    # Scale down by the number of waveforms to keep average amplitude similar to the original
-    return mixed_audio / len(waveforms)
-
-def generate_sound_waveform(frequency: float, duration, volume=1) -> np.float32:
+def generate_sound_waveform(frequency: float, duration, volume=1, rate: int = SAMPLE_RATE) -> np.float32:
     """This generates a notes waveform based on frequency
 
     Args:
         frequency (float): frequncy for given note
         duration (float, optional): duration for the note.
         volume (int, optional): volume for the note. Defaults to 1.
+        rate (int, optional): sample rate. Defaults to SAMPLE_RATE.
 
     Returns:
        np.float32: this is the waveform for the note
     """
-    t = np.linspace(0, duration, int(44100 * duration), endpoint=False)
+    t = np.linspace(0, duration, int(rate * duration), endpoint=False)
     waveform = volume * np.sin(2 * np.pi * frequency * t)
     return waveform.astype(np.float32)
 
-def generate_rest_waveform(duration) -> np.float32:
+def generate_rest_waveform(duration, rate: int = SAMPLE_RATE) -> np.float32:
     """This generates a rest waveform based on frequency
 
     Args:
         duration (float, optional): duration for the rest. Defaults to 0.5.
+        rate (int, optional): sample rate. Defaults to SAMPLE_RATE.
 
     Returns:
        np.float32: this is the waveform for the rest
     """
     # Calculate the number of samples
-    num_samples = int(44100 * duration)
+    num_samples = int(rate * duration)
     # Create an array of zeros
     silence_waveform = np.zeros(num_samples, dtype=np.float32)
     return silence_waveform
 
-def generate_frequency(note: str, octave: int, mutation: int) -> float:
+def generate_frequency(note: str, octave: int, mutation: int, tuning: str = EQUAL) -> float:
     """This generates the frequency for a note on a variety of factors
 
     Args:
         note (str): this is what hexachord note to play
         octave (int): this is how many octaves about the default hexachord octave
         mutation (int): this determines the frequency based on medival hexachord
+        tuning (str, optional): tuning system (see src/tuning.py). Defaults to EQUAL.
 
     Returns:
         float: frequency for parameters
     """
-    to_mutation = {
-        "G": 98,
-        "c": 130,
-        "f": 174,
-        "g": 196,
-        "c'": 262,
-        "f'": 349,
-        "g'": 392
-    }
-    to_semitone = {
-        "ut": 0,
-        "re": 2,
-        "mi": 4,
-        "fa": 5,
-        "sol": 7,
-        "la": 9
-    }
-    semitone = to_semitone[note] if note in to_semitone.keys() else to_semitone["ut"]
-    hexachord = to_mutation[mutation] if mutation in to_mutation.keys() else to_mutation["c'"]
-    octave = octave if octave is not None else 0
-
-    # calculate and return frequency
-    return (hexachord) * (2**(semitone/12)) * (2**octave)
-
-def music_to_waveform(music: "list[dict]") -> np.ndarray:
+    return frequency(note, octave, mutation, tuning)
+
+@instrument.profiled("render", lambda: {"waveform": WAVEFORM_CACHE})
+def music_to_waveform(music: "list[dict] | ScoreArray", context: RenderContext = None, tuning: str = EQUAL) -> np.ndarray:
     """This is the main function to translate music notation to a single waveform
 
     Args:
-        music (list[dict]): array of musical notes stored as dictionaries
+        music (list[dict] | ScoreArray): array of musical notes stored as dictionaries or a columnar voice
+        context (RenderContext, optional): sample rate of the waveform. Defaults to FINAL_CONTEXT.
+        tuning (str, optional): tuning system (see src/tuning.py). Defaults to EQUAL.
 
     Returns:
         np.ndarray: returned waveform
     """
-    # note array for all the note waveforms
-    voice = []
-    # keeps record for joined waveforms
+    if isinstance(music, ScoreArray):
+        music = music.to_music()
+
+    # lay out every note first, then fill one buffer
+    with instrument.span("plan"):
+        waveforms, length = plan_voice(music, (context or FINAL_CONTEXT).rate, tuning)
+    return synthesize_voice(waveforms, length)
+
+## ONE PASS RENDERER ##
+# envelopes applied to a note: (start within the note, ramp, length of the ramp)
+TRANSITION = 0.02 # seconds
+FADE_IN, FADE_OUT, SLUR_IN, SLUR_OUT = range(4)
+BLOCK = 1024
+BLOCK_SAMPLES = np.arange(BLOCK, dtype=np.float64)
+
+@lru_cache(maxsize=None)
+def get_ramp(ramp: int, length: int) -> np.float32:
+    """This gives a fade or slur ramp of a number of samples (shared, so read only)"""
+    if ramp == SLUR_OUT:
+        ramp_waveform = 1 - np.linspace(0, 1, length, dtype=np.float32)
+    elif ramp == FADE_OUT:
+        ramp_waveform = np.linspace(1, 0, length, dtype=np.float32)
+    else:
+        ramp_waveform = np.linspace(0, 1, length, dtype=np.float32)
+    ramp_waveform.flags.writeable = False
+    return ramp_waveform
+
+def plan_voice(music: "list[list[dict]]", rate: int = SAMPLE_RATE, tuning: str = EQUAL) -> "tuple[list[tuple], int]":
+    """This lays out the notes of a voice (see iter_waveforms)
+
+    Args:
+        music (list[list[dict]]): chords of a voice
+        rate (int, optional): sample rate. Defaults to SAMPLE_RATE.
+        tuning (str, optional): tuning system (see src/tuning.py). Defaults to EQUAL.
+
+    Returns:
+        tuple[list[tuple], int]: (offset, length, notes) of each waveform of the voice and the length of the voice in samples
+    """
+    waveforms = list(iter_waveforms(music, rate, tuning))
+    return waveforms, waveforms[-1][0] + waveforms[-1][1]
+
+def iter_waveforms(music: "list[list[dict]]", rate: int = SAMPLE_RATE, tuning: str = EQUAL, offset: int = 0, onsets: list = None) -> "Iterator[tuple]":
+    """This lays out the notes of a voice exactly like chaining fade_waveform, add_slur and mix_waveforms would,
+    without generating any audio. A waveform is [length, notes] and a note is [offset, length, cycles per sample, gain, envelopes].
+    Waveforms are yielded as soon as they are complete, so playback can start before the voice is laid out.
+
+    Args:
+        music (list[list[dict]]): chords of a voice
+        rate (int, optional): sample rate. Defaults to SAMPLE_RATE.
+        tuning (str, optional): tuning system (see src/tuning.py). Defaults to EQUAL.
+        offset (int, optional): sample the voice starts at. Defaults to 0.
+        onsets (list, optional): the sample each chord starts at is appended to it. Defaults to None.
+
+    Returns:
+        Iterator[tuple]: (offset, length, notes) of each waveform of the voice
+    """
+    def waveform(frequency: float, duration: float) -> list:
+        length = int(rate * duration)
+        cycles = frequency * duration / length if length else 0
+        return [length, [[0, length, cycles, 1, []]]]
+
+    def envelope(waveform: list, start: int, ramp: int) -> None:
+        # every note under [start, start + transition) of a slurred chain (notes in order)
+        for note in reversed(waveform[1]):
+            if note[0] + note[1] <= start:
+                break
+            if note[0] < start + transition and note[0] + note[1] > start:
+                note[4].append((start - note[0], ramp, transition))
+
+    def fade(waveform: list) -> list:
+        for note in waveform[1]:
+            if note[0] < transition:
+                note[4].append((-note[0], FADE_IN, transition))
+            if note[0] + note[1] > waveform[0] - transition:
+                note[4].append((waveform[0] - transition - note[0], FADE_OUT, transition))
+        return waveform
+
+    def slur(waveform1: list, waveform2: list) -> list:
+        envelope(waveform1, waveform1[0] - transition, SLUR_OUT)
+        for note in waveform2[1]:
+            note[4].append((-note[0], SLUR_IN, transition))
+            note[0] += waveform1[0] - transition
+        waveform1[1].extend(waveform2[1])
+        waveform1[0] += waveform2[0] - transition
+        return waveform1
+
+    def mix(waveforms: list) -> list:
+        notes = []
+        for waveform in waveforms:
+            for note in waveform[1]:
+                note[3] /= len(waveforms)
+            notes.extend(waveform[1])
+        return [max(waveform[0] for waveform in waveforms), notes]
+
+    # same walk as the original renderer
+    transition = int(rate * TRANSITION)
+    frequencies = iter_music_frequencies(music, tuning)
     current_waveform = None
-    # convert music to waveform
     for chord in music:
+        # a chord slurred to the chain being built starts where the chain's last note fades out
+        if onsets is not None:
+            onsets.append(offset if current_waveform is None else offset + current_waveform[0] - transition)
+
         waveforms = []
-        # do not allow slurs in a chord
         canSlur = False if len(chord) > 1 else True
         isChord = True if len(chord) > 1 else False
 
         for note in chord:
-            # handle note
             if note["type"] == "note":
-                # clean note
                 join = True if note["note"].endswith("+") and canSlur else False
-                music_note = note["note"].rstrip("+")
+                note_waveform = waveform(next(frequencies), note["duration"])
 
-                # generate frequency and waveform
-                frequency = generate_frequency(music_note, note["octave"], note["mutation"])
-                waveform = generate_sound_waveform(frequency, note["duration"])
-
-                # add to current
                 if join and current_waveform is not None:
-                    current_waveform = add_slur(current_waveform, waveform)
-
-                # join but none detected
+                    current_waveform = slur(current_waveform, note_waveform)
                 elif join:
-                    current_waveform = waveform
-
+                    current_waveform = note_waveform
+                elif current_waveform is not None and not isChord:
+                    waveforms.append(fade(slur(current_waveform, note_waveform)))
+                    current_waveform = None
                 else:
-                    # no join detected but previous exists to cross fade
-                    if current_waveform is not None and not isChord:
-                        current_waveform = add_slur(current_waveform, waveform)
-                        current_waveform = fade_waveform(current_waveform)
-                        # return
-                        waveforms.append(current_waveform)
-                        current_waveform = None
-                    # regular note
-                    else:
-                        waveform = fade_waveform(waveform)
-                        waveforms.append(waveform)
-
-            # handle rest
+                    waveforms.append(fade(note_waveform))
+
             elif note["type"] == "rest":
-                # generate rest waveform
-                rest_waveform = generate_rest_waveform(note["duration"])
-                # reset join because a rest cant be joined
                 if current_waveform is not None:
                     waveforms.append(current_waveform)
                     current_waveform = None
-                # add rest
-                waveforms.append(rest_waveform)
+                waveforms.append([int(rate * note["duration"]), []])
 
         if len(waveforms) == 0:
             continue
 
-        # get our note end product
-        note_waveform = mix_waveforms(waveforms) if len(waveforms) > 1 else waveforms[0]
-
-        # check to see if there was a slur to the chord
+        note_waveform = mix(waveforms) if len(waveforms) > 1 else waveforms[0]
         if isChord and current_waveform is not None:
-            note_waveform = add_slur(current_waveform, note_waveform)
-            note_waveform = fade_waveform(note_waveform)
+            note_waveform = fade(slur(current_waveform, note_waveform))
             current_waveform = None
 
-        voice.append(note_waveform) 
+        yield (offset, note_waveform[0], note_waveform[1])
+        offset += note_waveform[0]
 
-    # check if last note was meant to be joined
     if current_waveform is not None:
-        voice.append(current_waveform)
+        yield (offset, current_waveform[0], current_waveform[1])
+        offset += current_waveform[0]
+
+    # rest buffer
+    yield (offset, rate, [])
+
+def sine_phase(cycles: np.ndarray) -> np.float32:
+    """This turns a phase in cycles to radians in float32, dropping the whole cycles first so float32 stays accurate"""
+    cycles -= np.floor(cycles)
+    return (cycles * (2 * np.pi)).astype(np.float32)
+
+def synthesize_note(size: int, cycles_per_sample: float, envelopes: "tuple[tuple]") -> np.float32:
+    """This generates a note's sine with its fades and slurs.
+    The sine is built from one block of samples rotated by the angle of every block (sin(a + b) = sin a cos b + cos a sin b),
+    so only BLOCK sines are computed per note.
+
+    Args:
+        size (int): length of the note in samples
+        cycles_per_sample (float): frequency of the note over the sample rate
+        envelopes (tuple[tuple]): (start, ramp, length) of every fade and slur
+
+    Returns:
+        np.float32: the note's waveform
+    """
+    # phase (in whole cycles) of the first block and of the start of every block
+    rows = -(-size // BLOCK)
+    block = sine_phase(BLOCK_SAMPLES * cycles_per_sample)
+    block_start = sine_phase(np.arange(rows) * (BLOCK * cycles_per_sample))
+
+    # sin(block_start + block) for every sample of the note
+    note_waveform = np.multiply.outer(np.cos(block_start), np.sin(block)).reshape(-1)
+    note_waveform += np.multiply.outer(np.sin(block_start), np.cos(block)).reshape(-1)
+    note_waveform = note_waveform[:size]
+
+    # fades and slurs
+    for start, ramp, length in envelopes:
+        ramp = get_ramp(ramp, length)
+        begin, end = max(start, 0), min(start + len(ramp), size)
+        if begin < end:
+            note_waveform[begin:end] *= ramp[begin - start:end - start]
+
+    return note_waveform
+
+def cached_note(note: list, cache: "WaveformCache") -> np.float32:
+    """This gives the waveform of a note laid out by plan_voice from the cache, generating it on a miss"""
+    _, size, cycles_per_sample, _, envelopes = note
+    key = (size, cycles_per_sample, tuple(envelopes))
+    note_waveform = cache.get(key)
+    if note_waveform is None:
+        note_waveform = synthesize_note(size, cycles_per_sample, key[2])
+        instrument.allocated(note_waveform.nbytes)
+        cache.put(key, note_waveform)
+    return note_waveform
+
+def cached_chord(size: int, notes: "list[list]", cache: "WaveformCache") -> np.float32:
+    """This gives the waveform of a chord laid out by plan_voice from the cache, mixing it on a miss"""
+    key = (size, tuple((note[1], note[2], note[3], tuple(note[4])) for note in notes))
+    chord = cache.get(key)
+    if chord is None:
+        chord = np.zeros(size, dtype=np.float32)
+        instrument.allocated(chord.nbytes)
+        add_notes(chord, notes, cache)
+        cache.put(key, chord)
+    return chord
+
+def is_chord(notes: "list[list]") -> bool:
+    """Chords are waveforms where every note starts together"""
+    return len(notes) > 1 and all(note[0] == 0 for note in notes)
+
+def add_notes(waveform: np.ndarray, notes: "list[list]", cache: "WaveformCache") -> None:
+    """This adds notes laid out by plan_voice to a waveform, reusing the cached ones"""
+    for note in notes:
+        offset, size, _, gain, _ = note
+        if size == 0:
+            continue
+
+        note_waveform = cached_note(note, cache)
+        if gain != 1:
+            waveform[offset:offset + size] += note_waveform * np.float32(gain)
+        else:
+            waveform[offset:offset + size] += note_waveform
+
+def synthesize_voice(waveforms: "list[tuple]", length: int, cache: "WaveformCache" = None) -> np.ndarray:
+    """This fills a single preallocated buffer with the waveforms laid out by plan_voice.
+    Repeated notes and chords are copied from the waveform cache.
+
+    Args:
+        waveforms (list[tuple]): waveforms from plan_voice
+        length (int): length of the voice in samples
+        cache (WaveformCache, optional): cache of note and chord waveforms. Defaults to WAVEFORM_CACHE.
+
+    Returns:
+        np.float32: the voice's waveform
+    """
+    cache = cache if cache is not None else WAVEFORM_CACHE
+    voice = np.zeros(length, dtype=np.float32)
+    instrument.allocated(voice.nbytes)
+
+    with instrument.span("synthesize"):
+        for offset, size, notes in waveforms:
+            # chords
+            if is_chord(notes):
+                voice[offset:offset + size] = cached_chord(size, notes, cache)
+
+            # notes and slurred chains
+            elif notes:
+                add_notes(voice[offset:offset + size], notes, cache)
+
+    return voice
+
+## WAVEFORM CACHE ##
+class WaveformCache:
+    """This is a least recently used cache of note and chord waveforms limited to a number of bytes"""
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.waveforms = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.RLock() # voices are rendered on several threads
+
+    def get(self, key: tuple) -> "np.ndarray | None":
+        with self.lock:
+            waveform = self.waveforms.get(key)
+            if waveform is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.waveforms.move_to_end(key)
+            return waveform
+
+    def put(self, key: tuple, waveform: np.ndarray) -> None:
+        with self.lock:
+            if waveform.nbytes > self.max_bytes or key in self.waveforms:
+                return
+            waveform.flags.writeable = False
+            self.waveforms[key] = waveform
+            self.bytes += waveform.nbytes
+
+            # evict the least recently used
+            while self.bytes > self.max_bytes:
+                evicted_key, evicted = self.waveforms.popitem(last=False)
+                self.bytes -= evicted.nbytes
+                self.evicted(evicted_key)
+
+    def evicted(self, key: tuple) -> None:
+        """This is called with the lock held for every waveform pushed out of the cache"""
+
+    def clear(self) -> None:
+        with self.lock:
+            self.waveforms.clear()
+            self.bytes = 0
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> dict:
+        """Hits, misses, hit rate, bytes and number of cached waveforms"""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0,
+            "bytes": self.bytes,
+            "waveforms": len(self.waveforms)
+        }
+
+WAVEFORM_CACHE = WaveformCache(int(os.environ.get("ORGANUM_WAVEFORM_CACHE", 64 * 1024 * 1024)))
+RENDER_WORKERS = int(os.environ.get("ORGANUM_RENDER_WORKERS", 0)) or os.cpu_count() or 1
+
+## RENDERED AUDIO CACHE ##
+class AudioCache(WaveformCache):
+    """This is a least recently used cache of mixed renders, so replaying a score does not render it again.
+    Renders are keyed by render_key (the score's content hash first), and a source (ex. a file) only keeps the renders of its latest content."""
+    def __init__(self, max_bytes: int):
+        super().__init__(max_bytes)
+        self.sources = {}
+
+    def put(self, key: tuple, waveform: np.ndarray, source: str = None) -> None:
+        # renders are put from the audio thread's hand off and discarded from Tk, so the sources change under the lock
+        with self.lock:
+            if source is not None:
+                if self.sources.get(source, key)[0] != key[0]:
+                    self.discard(source)
+                self.sources.setdefault(source, (key[0], set()))[1].add(key)
+            super().put(key, waveform)
+
+    def evicted(self, key: tuple) -> None:
+        for source, (_, keys) in list(self.sources.items()):
+            keys.discard(key)
+            if not keys:
+                del self.sources[source]
+
+    def discard(self, source: str) -> None:
+        """This drops the renders of a source, ex. when its text changes"""
+        with self.lock:
+            _, keys = self.sources.pop(source, (None, ()))
+            for key in keys:
+                waveform = self.waveforms.pop(key, None)
+                if waveform is not None:
+                    self.bytes -= waveform.nbytes
+
+    def clear(self) -> None:
+        with self.lock:
+            super().clear()
+            self.sources.clear()
+
+AUDIO_CACHE = AudioCache(int(os.environ.get("ORGANUM_AUDIO_CACHE", 256 * 1024 * 1024)))
+
+def render_key(key: str, context: RenderContext, tuning: str = None, gains: "list[float]" = None, pans: "list[float]" = None, limit: float = None) -> tuple:
+    """This makes the AUDIO_CACHE key of a score's content hash rendered with some settings"""
+    return (key, context.rate, context.dtype, tuning or EQUAL, gains and tuple(gains), pans and tuple(pans), limit)
+
+## MIXING BUS ##
+MIX_CHUNK = 65536 # samples scaled at a time, so gains never copy a whole voice
+LIMITER_BLOCK = 1024 # samples sharing one limiter gain
+
+class MixBus:
+    """This mixes voices in place into one preallocated float32 buffer with a gain and a pan per voice.
+    Voices are averaged like mix_waveforms, or summed and kept under a peak by the limiter."""
+    def __init__(self, voices: int, gains: "list[float]" = None, pans: "list[float]" = None, limit: float = None):
+        """
+        Args:
+            voices (int): number of voices
+            gains (list[float], optional): gain of each voice. Defaults to 1.
+            pans (list[float], optional): pan of each voice from -1 (left) to 1 (right), gives a stereo mix. Defaults to mono.
+            limit (float, optional): peak of the limiter instead of averaging the voices. Defaults to averaging.
+        """
+        gains = list(gains) if gains is not None else [1.0] * voices
+        if len(gains) != voices or (pans is not None and len(pans) != voices):
+            raise ValueError(f"expected a gain and a pan for each of the {voices} voices")
+
+        self.voices = voices
+        self.channels = 1 if pans is None else 2
+        self.limit = limit
+        self.limiter_gain = 1.0
+
+        # gain of each voice in each channel (constant power pan)
+        if pans is None:
+            self.gains = [np.array([gain], dtype=np.float32) for gain in gains]
+        else:
+            self.gains = [np.array([np.cos((pan + 1) * np.pi / 4), np.sin((pan + 1) * np.pi / 4)], dtype=np.float32) * np.float32(gain) for gain, pan in zip(gains, pans)]
+
+    def allocate(self, length: int) -> np.ndarray:
+        """This gives a silent output buffer, (length,) for mono and (length, 2) for stereo"""
+        buffer = np.zeros(length if self.channels == 1 else (length, 2), dtype=np.float32)
+        instrument.allocated(buffer.nbytes)
+        return buffer
+
+    def add(self, buffer: np.ndarray, voice: int, waveform: np.ndarray, offset: int = 0) -> None:
+        """This adds a voice's waveform into the buffer in place at an offset
 
-    # generate rest buffer
-    voice.append(generate_rest_waveform(duration=1))
+        Args:
+            buffer (np.ndarray): output buffer from allocate
+            voice (int): index of the voice
+            waveform (np.ndarray): mono waveform of the voice
+            offset (int, optional): sample of the buffer the waveform starts at. Defaults to 0.
+        """
+        gains = self.gains[voice]
+        if self.channels == 1 and gains[0] == 1:
+            buffer[offset:offset + len(waveform)] += waveform
+            return
 
-    # make one waveform
-    return np.concatenate(voice)
+        for start in range(0, len(waveform), MIX_CHUNK):
+            chunk = waveform[start:start + MIX_CHUNK]
+            target = buffer[offset + start:offset + start + len(chunk)]
+            if self.channels == 1:
+                target += chunk * gains[0]
+            else:
+                target += np.multiply.outer(chunk, gains)
+
+    def finish(self, buffer: np.ndarray) -> np.ndarray:
+        """This averages the voices of the buffer or limits its peaks, in place (call once per buffer, in order)
+
+        Args:
+            buffer (np.ndarray): output buffer holding every voice
+
+        Returns:
+            np.ndarray: the mixed buffer
+        """
+        if self.limit is None:
+            buffer /= self.voices
+            return buffer
+
+        for start in range(0, len(buffer), MIX_CHUNK):
+            self.limit_peaks(buffer[start:start + MIX_CHUNK])
+        return buffer
+
+    def limit_peaks(self, chunk: np.ndarray) -> None:
+        """This scales every LIMITER_BLOCK of the chunk so its peak is at most the limit.
+        The gain drops at once and ramps back over a block, and the last gain carries to the next chunk."""
+        levels = np.abs(chunk) if self.channels == 1 else np.abs(chunk).max(axis=1)
+        peaks = np.maximum.reduceat(levels, np.arange(0, len(levels), LIMITER_BLOCK))
+        with np.errstate(divide="ignore"):
+            gains = np.minimum(1, self.limit / peaks)
+
+        # ramp from the previous block's gain, never above this block's
+        begins = np.minimum(np.concatenate(([self.limiter_gain], gains[:-1])), gains)
+        self.limiter_gain = float(gains[-1])
+        if begins.min() == 1:
+            return
+
+        ramp = np.linspace(0, 1, LIMITER_BLOCK, dtype=np.float32)
+        envelope = (begins[:, None] + (gains - begins)[:, None] * ramp).astype(np.float32).reshape(-1)[:len(chunk)]
+        chunk *= envelope if self.channels == 1 else envelope[:, None]
+
+## STREAMING ##
+STREAM_BLOCK = 1024 # samples per callback (23 ms at 44100 Hz, 93 ms at 11025 Hz)
+
+def synthesize_note_slice(cycles_per_sample: float, envelopes: "list[tuple]", start: int, stop: int) -> np.float32:
+    """This generates samples [start, stop) of a note's sine with its fades and slurs, so streaming never holds a whole note
+
+    Args:
+        cycles_per_sample (float): frequency of the note over the sample rate
+        envelopes (list[tuple]): (start, ramp, length) of every fade and slur
+        start (int): first sample of the slice within the note
+        stop (int): end of the slice within the note
+
+    Returns:
+        np.float32: the slice of the note's waveform
+    """
+    note_waveform = np.sin(sine_phase(np.arange(start, stop, dtype=np.float64) * cycles_per_sample))
+
+    # fades and slurs overlapping the slice
+    for envelope_start, ramp, length in envelopes:
+        ramp = get_ramp(ramp, length)
+        begin, end = max(envelope_start, start), min(envelope_start + len(ramp), stop)
+        if begin < end:
+            note_waveform[begin - start:end - start] *= ramp[begin - envelope_start:end - envelope_start]
+
+    return note_waveform
+
+class VoiceStream:
+    """This renders a voice block by block, laying out its waveforms only as far as the current block"""
+    def __init__(self, music: "list[list[dict]] | ScoreArray", rate: int = SAMPLE_RATE, tuning: str = EQUAL, offset: int = 0):
+        if isinstance(music, ScoreArray):
+            music = music.to_music()
+        self.waveforms = iter_waveforms(music, rate, tuning, offset)
+        self.sounding = deque() # [offset, length, notes sorted by offset, first note still sounding]
+        self.position = 0
+        self.laid_out = 0
+        self.finished = False
+
+    def read(self, block: np.ndarray) -> bool:
+        """This adds the next len(block) samples of the voice to block
+
+        Args:
+            block (np.ndarray): float32 buffer to add to
+
+        Returns:
+            bool: True while the voice has samples after this block
+        """
+        start, end = self.position, self.position + len(block)
+
+        # lay out the waveforms that start before the end of the block
+        while not self.finished and self.laid_out < end:
+            try:
+                offset, size, notes = next(self.waveforms)
+            except StopIteration:
+                self.finished = True
+                break
+            self.sounding.append([offset, size, sorted(notes, key=lambda note: note[0]), 0])
+            self.laid_out = offset + size
+
+        # forget the waveforms that ended before the block
+        while self.sounding and self.sounding[0][0] + self.sounding[0][1] <= start:
+            self.sounding.popleft()
+
+        for waveform in self.sounding:
+            offset, _, notes, first = waveform
+            if offset >= end:
+                break
+
+            # skip the notes that already ended
+            while first < len(notes) and offset + notes[first][0] + notes[first][1] <= start:
+                first += 1
+            waveform[3] = first
+
+            for index in range(first, len(notes)):
+                note_offset, size, cycles_per_sample, gain, envelopes = notes[index]
+                note_start = offset + note_offset
+                if note_start >= end:
+                    break
+                begin, stop = max(start, note_start), min(end, note_start + size)
+                if begin >= stop:
+                    continue
+
+                note_waveform = synthesize_note_slice(cycles_per_sample, envelopes, begin - note_start, stop - note_start)
+                if gain != 1:
+                    note_waveform *= np.float32(gain)
+                block[begin - start:stop - start] += note_waveform
+
+        self.position = end
+        return not self.finished or end < self.laid_out
+
+class OrganumStream:
+    """This mixes the voices of an organum block by block on a MixBus"""
+    def __init__(self, organum: list, rate: int = SAMPLE_RATE, bus: MixBus = None, tuning: str = EQUAL, start: int = 0, index: "SourceIndex" = None):
+        if start and (index is None or index.rate != rate):
+            index = SourceIndex(organum, rate=rate)
+
+        # from start, each voice skips the chords before it without laying them out
+        self.voices = []
+        for voice, music in enumerate(organum):
+            offset = 0
+            if start:
+                music = music.to_music() if isinstance(music, ScoreArray) else music
+                onsets = index.onsets[voice]
+                chord = bisect_left(onsets, start)
+                offset = onsets[chord] - start if chord < len(onsets) else 0
+                music = music[chord:]
+            self.voices.append(VoiceStream(music, rate, tuning, offset))
+        self.bus = bus if bus is not None else MixBus(len(organum))
+        self.position = 0
+
+    def read(self, frames: int, pool: ThreadPoolExecutor = None) -> "tuple[np.ndarray, bool]":
+        """This renders the next block of the organum, the last block stops where the organum ends
+
+        Args:
+            frames (int): samples in the block
+            pool (ThreadPoolExecutor, optional): threads rendering the voices. Defaults to None.
+
+        Returns:
+            tuple[np.ndarray, bool]: the mixed block and whether the organum has samples after it
+        """
+        def read_voice(voice: VoiceStream) -> "tuple[np.ndarray, bool]":
+            voice_block = np.zeros(frames, dtype=np.float32)
+            return voice_block, voice.read(voice_block)
+
+        # mixed in voice order whether or not the voices were rendered on threads
+        block = self.bus.allocate(frames)
+        playing = False
+        for voice, (voice_block, voice_playing) in enumerate((pool.map if pool is not None else map)(instrument.bind(read_voice), self.voices)):
+            self.bus.add(block, voice, voice_block)
+            playing = playing or voice_playing
+        self.bus.finish(block)
+
+        if not playing:
+            block = block[:max(voice.laid_out for voice in self.voices) - self.position]
+        self.position += len(block)
+        return block, playing
+
+stream = None # sounddevice stream being played
+playback = None # (stream, rate, frame, DAC time): the frame of the score heard at a time of the stream playing it
+
+## SOURCE INDEX ##
+class SourceIndex:
+    """This maps the source span of every chord to the samples it sounds for, to play from a cursor, seek or follow the playback.
+    The chords of a voice follow each other, so both directions are a bisect per voice."""
+    def __init__(self, organum: list, positions: "list[list[tuple]]" = None, rate: int = SAMPLE_RATE):
+        """
+        Args:
+            organum (list): voices as returned by compile_text
+            positions (list[list[tuple]], optional): (line, column, end line, end column) of each chord per voice from compile_text. Defaults to none.
+            rate (int, optional): sample rate. Defaults to SAMPLE_RATE.
+        """
+        self.rate = rate
+        self.positions = positions if positions is not None else [[] for _ in organum]
+        self.onsets = []
+        self.ends = []
+
+        # lay out every voice without generating audio (its last waveform is the rest after it)
+        for music in organum:
+            music = music.to_music() if isinstance(music, ScoreArray) else music
+            onsets = []
+            end = 0
+            for end, _, _ in iter_waveforms(music, rate, onsets=onsets):
+                pass
+            self.onsets.append(onsets)
+            self.ends.append(end)
+
+    def sample(self, line: int, column: int = 0) -> int:
+        """This gives the sample of the chord at a source position, or the first one after it, in the voice holding it (line from 1, column from 0)"""
+        cursor = (line, column)
+
+        # the voices follow each other in the source
+        voice = None
+        for index, positions in enumerate(self.positions):
+            if positions and positions[0][:2] <= cursor:
+                voice = index
+        if voice is None:
+            return 0
+
+        # past the voice's last chord (ex. between two voices) plays from the first chord of the next voice
+        if self.positions[voice][-1][2:] < cursor:
+            for index in range(voice + 1, len(self.positions)):
+                if self.positions[index]:
+                    return self.onsets[index][0]
+
+        onsets = self.onsets[voice]
+        positions = self.positions[voice]
+        chord = bisect_left(positions, cursor)
+        if chord and positions[chord - 1][2:] >= cursor:
+            chord -= 1
+        return onsets[min(chord, len(onsets) - 1)]
+
+    def sounding(self, sample: int) -> "list[tuple]":
+        """This gives the source span of the chord sounding at a sample in each voice"""
+        spans = []
+        for positions, onsets, end in zip(self.positions, self.onsets, self.ends):
+            chord = bisect_right(onsets, sample) - 1
+            if 0 <= chord < len(positions) and sample < end:
+                spans.append(positions[chord])
+        return spans
+
+    def seconds(self, seconds: float) -> int:
+        """This gives the sample of a time in the score"""
+        return int(seconds * self.rate)
+
+## EXPORT ##
+EXPORT_CHUNK = 65536 # samples rendered and written at a time
+EXPORT_FORMATS = (".wav", ".flac")
+
+def organum_samples(organum: list, rate: int = SAMPLE_RATE) -> int:
+    """This estimates the length of an organum in samples without laying it out (slurs make it slightly shorter)"""
+    seconds = 0
+    for voice in organum:
+        music = voice.to_music() if isinstance(voice, ScoreArray) else voice
+        seconds = max(seconds, sum(max(note["duration"] for note in chord) for chord in music if chord))
+    return max(int(seconds * rate) + rate, 1)
+
+@instrument.profiled("export", lambda: {"waveform": WAVEFORM_CACHE})
+def export(organum: list, file_path: str, context: RenderContext = None, subtype: str = None, chunk: int = EXPORT_CHUNK, workers: int = None,
+           gains: "list[float]" = None, pans: "list[float]" = None, limit: float = None, tuning: str = None, progress=None) -> int:
+    """This renders an organum to an audio file chunk by chunk, so only one chunk of audio is ever in memory
+
+    Args:
+        organum (list): voices as returned by compile_score
+        file_path (str): path to the audio file, its extension (.wav or .flac) picks the format
+        context (RenderContext, optional): sample rate and sample type. Defaults to FINAL_CONTEXT.
+        subtype (str, optional): soundfile subtype such as "PCM_16", "PCM_24" or "FLOAT". Defaults to the format's default.
+        chunk (int, optional): samples rendered and written at a time. Defaults to EXPORT_CHUNK.
+        workers (int, optional): threads rendering the voices of each chunk. Defaults to RENDER_WORKERS.
+        gains, pans, limit: mix of the voices (see MixBus). Defaults to averaging them in mono.
+        tuning (str, optional): tuning system, usually the score's file_data["tuning"]. Defaults to EQUAL.
+        progress (callable, optional): called with the fraction written after every chunk, the file is removed if it raises. Defaults to None.
+
+    Returns:
+        int: number of samples written
+    """
+    import soundfile as sf
+
+    if not organum:
+        raise ValueError("score has no voices")
+    extension = os.path.splitext(file_path)[1].lower()
+    if extension not in EXPORT_FORMATS:
+        raise ValueError(f"can not export {extension or 'a file without an extension'}, expected {' or '.join(EXPORT_FORMATS)}")
+
+    context = context or FINAL_CONTEXT
+    bus = MixBus(len(organum), gains, pans, limit)
+    source = OrganumStream(organum, context.rate, bus, tuning or EQUAL)
+    workers = min(workers or RENDER_WORKERS, len(organum))
+    pool = ThreadPoolExecutor(max_workers=workers) if workers > 1 else None
+    samples = organum_samples(organum, context.rate) if progress is not None else 0
+    try:
+        with sf.SoundFile(file_path, "w", samplerate=context.rate, channels=bus.channels, subtype=subtype) as FILE:
+            playing = True
+            while playing:
+                with instrument.span("stream"):
+                    block, playing = source.read(chunk, pool)
+                with instrument.span("write"):
+                    FILE.write(context.convert(block))
+                if progress is not None:
+                    progress(min(source.position / samples, 1) if playing else 1)
+    except BaseException:
+        # no partial files
+        if os.path.exists(file_path):
+            os.remove(file_path)
+        raise
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    return source.position
 
 ## MAIN ##
-def play(organum: list):
-    # create sound
-    organum = [music_to_waveform(voice) for voice in organum] # generate the waveforms for each voice
-    mixed_waveform = mix_waveforms(organum)
+@instrument.profiled("render", lambda: {"waveform": WAVEFORM_CACHE})
+def render(organum: list, workers: int = None, gains: "list[float]" = None, pans: "list[float]" = None, limit: float = None,
+           context: RenderContext = None, tuning: str = None, progress=None) -> np.ndarray:
+    """This renders every voice of an organum on a thread pool (NumPy releases the GIL) and mixes them in voice order
+    into a single output buffer
+
+    Args:
+        organum (list): voices as returned by compile_score
+        workers (int, optional): number of threads. Defaults to RENDER_WORKERS.
+        gains (list[float], optional): gain of each voice. Defaults to 1.
+        pans (list[float], optional): pan of each voice from -1 (left) to 1 (right), gives a stereo mix. Defaults to mono.
+        limit (float, optional): peak of the limiter instead of averaging the voices. Defaults to averaging.
+        context (RenderContext, optional): sample rate and sample type. Defaults to FINAL_CONTEXT.
+        tuning (str, optional): tuning system, usually the score's file_data["tuning"]. Defaults to EQUAL.
+        progress (callable, optional): called with the fraction of voices mixed after every voice, raise to stop. Defaults to None.
+
+    Returns:
+        np.ndarray: mixed waveform at the context's rate, (samples,) in mono and (samples, 2) in stereo
+    """
+    if not organum:
+        raise ValueError("score has no voices")
+
+    # lay out every voice first, so the mix is one buffer as long as the longest voice
+    context = context or FINAL_CONTEXT
+    bus = MixBus(len(organum), gains, pans, limit)
+    with instrument.span("plan"):
+        music = [voice.to_music() if isinstance(voice, ScoreArray) else voice for voice in organum]
+        plans = [plan_voice(voice, context.rate, tuning or EQUAL) for voice in music]
+    instrument.count_music(music)
+    mixed = bus.allocate(max(length for _, length in plans))
+
+    def mix(voice: int, waveform: np.ndarray):
+        with instrument.span("mix"):
+            bus.add(mixed, voice, waveform)
+        if progress is not None: progress((voice + 1) / len(plans))
+
+    # generate the waveforms for each voice and add them in voice order, so the mix is deterministic
+    workers = min(workers or RENDER_WORKERS, len(organum))
+    if workers > 1:
+        # at most workers voices are in flight, so memory is the mix and a few voices rather than every voice
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            pending = deque()
+            synthesize = instrument.bind(synthesize_voice) # the voices record into this thread's session
+            for voice, plan in enumerate(plans):
+                pending.append(pool.submit(synthesize, *plan))
+                if len(pending) == workers:
+                    mix(voice + 1 - workers, pending.popleft().result())
+            for voice in range(len(plans) - len(pending), len(plans)):
+                mix(voice, pending.popleft().result())
+    else:
+        for voice, plan in enumerate(plans):
+            mix(voice, synthesize_voice(*plan))
 
-    sd.play(mixed_waveform, 44100) # plays sound
+    with instrument.span("finish"):
+        return context.convert(bus.finish(mixed))
+
+def play(organum: list, streaming: bool = True, blocksize: int = STREAM_BLOCK, workers: int = None,
+         gains: "list[float]" = None, pans: "list[float]" = None, limit: float = None, context: RenderContext = None, tuning: str = None,
+         key: str = None, source: str = None, start: int = 0, index: SourceIndex = None):
+    """This plays an organum, streaming it block by block so sound starts at once and stop() is heard within one block
+
+    Args:
+        organum (list): voices as returned by compile_score
+        streaming (bool, optional): render block by block instead of rendering everything first. Defaults to True.
+        blocksize (int, optional): samples per streamed block. Defaults to STREAM_BLOCK.
+        workers (int, optional): threads rendering the voices when not streaming. Defaults to RENDER_WORKERS.
+        gains, pans, limit: mix of the voices (see MixBus). Defaults to averaging them in mono.
+        context (RenderContext, optional): sample rate and sample type, PREVIEW_CONTEXT to audition quickly. Defaults to FINAL_CONTEXT.
+        tuning (str, optional): tuning system, usually the score's file_data["tuning"]. Defaults to EQUAL.
+        key (str, optional): content hash of the score, the first full play is kept in AUDIO_CACHE and replayed from it. Defaults to no caching.
+        source (str, optional): where the score comes from (ex. its file), replaces the source's older render. Defaults to None.
+        start (int, optional): sample to play from (see SourceIndex), only the music after it is rendered. Defaults to 0.
+        index (SourceIndex, optional): index of the organum at the context's rate, to start without laying out the music before start. Defaults to None.
+    """
+    # sounddevice is only needed to play, so rendering works without an audio device
+    import sounddevice as sd
+    global stream
+
+    # the play's session stays open while the stream plays, so it records the streamed blocks (see finished)
+    with instrument.session("play", lambda: {"waveform": WAVEFORM_CACHE, "audio": AUDIO_CACHE}) as recorded:
+        stop()
+        if not organum:
+            return
+
+        context = context or FINAL_CONTEXT
+        cache_key = render_key(key, context, tuning, gains, pans, limit) if key is not None and not start else None
+
+        # replay
+        cached = AUDIO_CACHE.get(cache_key) if cache_key is not None else None
+        if cached is not None:
+            with instrument.span("device start"):
+                sd.play(cached, context.rate)
+            start_clock(sd.get_stream(), context.rate)
+            return
+
+        if not streaming:
+            mixed_waveform = render(organum, workers, gains, pans, limit, context, tuning)
+            if cache_key is not None:
+                AUDIO_CACHE.put(cache_key, mixed_waveform, source)
+            with instrument.span("device start"):
+                sd.play(mixed_waveform, context.rate) # plays sound
+            start_clock(sd.get_stream(), context.rate)
+            return
+
+        # the played blocks are kept for replay unless they outgrow the cache
+        bus = MixBus(len(organum), gains, pans, limit)
+        organum_stream = OrganumStream(organum, context.rate, bus, tuning or EQUAL, start, index)
+        recording = [] if cache_key is not None else None
+        complete = False
+        frame = start
+        def callback(outdata, frames, time, status):
+            nonlocal recording, complete, frame
+            global playback
+
+            # the block's first frame reaches the speaker at its DAC time (0 when the host does not know it)
+            # (read once, stop() clears the clock from another thread and a newer play replaces it)
+            clock = playback
+            if clock is not None and clock[0] is output and time.outputBufferDacTime:
+                playback = (output, context.rate, frame, time.outputBufferDacTime)
+            frame += frames
+
+            with instrument.span("stream block"):
+                block, playing = organum_stream.read(frames)
+                block = context.convert(block)
+            outdata[:len(block)] = block.reshape(len(block), -1)
+            outdata[len(block):] = 0
+
+            if recording is not None:
+                recording.append(block)
+                if len(recording) * block.nbytes > AUDIO_CACHE.max_bytes:
+                    recording = None
+            if not playing:
+                complete = recording is not None
+                raise sd.CallbackStop
+
+        # once the stream is done the recording is joined and cached on its own thread, so no block waits for it
+        owned = isinstance(recorded, instrument.Session)
+        def finished():
+            if complete:
+                threading.Thread(target=lambda: AUDIO_CACHE.put(cache_key, np.concatenate(recording), source), name="organum-record", daemon=True).start()
+            if owned:
+                recorded.close()
+
+        # the callback runs on the audio thread, so it is handed the session to record its blocks into
+        with instrument.span("device start"):
+            stream = output = sd.OutputStream(samplerate=context.rate, blocksize=blocksize, channels=bus.channels, dtype=context.dtype, latency="low",
+                                               callback=instrument.bind(callback, instrument.recording()), finished_callback=finished)
+            start_clock(stream, context.rate, start)
+            stream.start()
+        if owned:
+            recorded.detach()
 
 def stop():
-    sd.stop() # stops sound
\ No newline at end of file
+    import sounddevice as sd
+    global stream, playback
+
+    # abort drops the queued blocks instead of playing them out, the clock is cleared once no callback can set it again
+    if stream is not None:
+        stream.abort()
+        stream.close()
+        stream = None
+    sd.stop() # stops sound
+    playback = None
+
+def start_clock(played, rate: int, start: int = 0) -> None:
+    """This estimates when the first frame of a stream about to play is heard, until its callback reports the DAC time"""
+    global playback
+    playback = (played, rate, start, played.time + played.latency)
+
+def position() -> "int | None":
+    """This gives the frame of the score being heard, at the rate it plays at
+
+    Returns:
+        int | None: frame from the start of the score, None when nothing plays
+    """
+    clock = playback
+    if clock is None:
+        return None
+    played, rate, frame, dac_time = clock
+    if not played.active:
+        return None
+    return max(frame + int((played.time - dac_time) * rate), 0)
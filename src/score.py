@@ -0,0 +1,155 @@
+import numpy as np
+
+# constants
+SAMPLE_RATE = 44100
+SYLLABLES = ["ut", "re", "mi", "fa", "sol", "la"]
+MUTATIONS = ["G", "c", "f", "g", "c'", "f'", "g'"]
+REST = -1
+NO_MUTATION = -1
+NO_OCTAVE = np.iinfo(np.int32).min
+
+# one record per note or rest
+NOTE_DTYPE = np.dtype([
+    ("pitch", np.int16),      # index into names, REST for rests
+    ("mutation", np.int16),   # index into mutations, NO_MUTATION when unset
+    ("octave", np.int32),     # NO_OCTAVE when unset
+    ("slur", np.bool_),       # note ends with "+"
+    ("chord", np.int32),      # index of the chord within the voice
+    ("onset", np.int64),      # written start in samples
+    ("length", np.int64),     # written length in samples
+    ("duration", np.float64)  # length in seconds (kept for lossless conversion)
+])
+
+class ScoreArray:
+    """This is a compact columnar voice: one NOTE_DTYPE record per note with its sample timeline precomputed.
+    The timeline is the written one (chords back to back, times rounded without drift). The player lays notes out again
+    from to_music(), truncating each length and overlapping slurs, so it is not where the rendered notes sound."""
+    __slots__ = ("notes", "names", "mutations", "rate")
+
+    def __init__(self, notes: np.ndarray, names: "list[str]" = None, mutations: "list[str]" = None, rate: int = SAMPLE_RATE):
+        self.notes = notes
+        self.names = names if names is not None else SYLLABLES.copy()
+        self.mutations = mutations if mutations is not None else MUTATIONS.copy()
+        self.rate = rate
+
+    def __len__(self) -> int:
+        return len(self.notes)
+
+    @property
+    def chords(self) -> int:
+        """Number of chords in the voice"""
+        return int(self.notes["chord"][-1]) + 1 if len(self.notes) else 0
+
+    @property
+    def samples(self) -> int:
+        """Written length of the voice in samples"""
+        return int((self.notes["onset"] + self.notes["length"]).max()) if len(self.notes) else 0
+
+    @classmethod
+    def from_music(cls, music: "list[list[dict]]", rate: int = SAMPLE_RATE) -> "ScoreArray":
+        """This builds the columnar voice from the compiler's chords of note dictionaries
+
+        Args:
+            music (list[list[dict]]): chords of a voice as returned by compile_score
+            rate (int, optional): sample rate of the timeline. Defaults to SAMPLE_RATE.
+
+        Returns:
+            ScoreArray: the columnar voice
+        """
+        names = SYLLABLES.copy()
+        mutations = MUTATIONS.copy()
+
+        # flatten the chords (rests have no note, octave or mutation)
+        flat = [note for chord in music for note in chord]
+        notes = np.zeros(len(flat), dtype=NOTE_DTYPE)
+        notes["chord"] = [index for index, chord in enumerate(music) for _ in chord]
+        notes["duration"] = [note["duration"] for note in flat]
+
+        # pitch and slur codes for every distinct note name
+        note_names = [note.get("note") for note in flat]
+        pitch_codes = {None: (REST, False)}
+        for name in set(note_names) - {None}:
+            syllable = name[:-1] if name.endswith("+") else name
+            if syllable not in names: names.append(syllable)
+            pitch_codes[name] = (names.index(syllable), syllable != name)
+        codes = [pitch_codes[name] for name in note_names]
+        notes["pitch"] = [pitch for pitch, _ in codes]
+        notes["slur"] = [slur for _, slur in codes]
+
+        # mutation codes for every distinct mutation
+        note_mutations = [note.get("mutation") for note in flat]
+        mutation_codes = {None: NO_MUTATION}
+        for mutation in set(note_mutations) - {None}:
+            if mutation not in mutations: mutations.append(mutation)
+            mutation_codes[mutation] = mutations.index(mutation)
+        notes["mutation"] = [mutation_codes[mutation] for mutation in note_mutations]
+        notes["octave"] = [NO_OCTAVE if note.get("octave") is None else note["octave"] for note in flat]
+
+        # a chord lasts as long as its longest note
+        chord_start = np.zeros(len(music) + 1, dtype=np.float64)
+        if len(flat):
+            first = np.flatnonzero(np.diff(notes["chord"], prepend=-1))
+            chord_start[notes["chord"][first] + 1] = np.maximum.reduceat(notes["duration"], first)
+
+        # round absolute times (not lengths) so drift cannot accumulate
+        np.cumsum(chord_start, out=chord_start)
+        onset = chord_start[notes["chord"]]
+        notes["onset"] = np.rint(onset * rate)
+        notes["length"] = np.rint((onset + notes["duration"]) * rate) - notes["onset"]
+
+        return cls(notes, names, mutations, rate)
+
+    def to_music(self) -> "list[list[dict]]":
+        """This converts the columnar voice back to the compiler's chords of note dictionaries
+
+        Returns:
+            list[list[dict]]: chords of the voice
+        """
+        # one dictionary per distinct note (shared like the compiler's, so treat them as read only)
+        fields = ["pitch", "mutation", "octave", "slur", "duration"]
+        records = np.empty(len(self.notes), dtype=NOTE_DTYPE[fields])
+        for field in fields: records[field] = self.notes[field]
+        _, first, inverse = np.unique(records.view(f"V{records.itemsize}"), return_index=True, return_inverse=True)
+        shared = []
+        for pitch, mutation, octave, slur, duration in records[first].tolist():
+            # rest
+            if pitch == REST:
+                shared.append({"type": "rest", "duration": duration})
+                continue
+
+            # note
+            shared.append({
+                "type": "note",
+                "note": self.names[pitch] + ("+" if slur else ""),
+                "duration": duration,
+                "octave": None if octave == NO_OCTAVE else octave,
+                "mutation": None if mutation == NO_MUTATION else self.mutations[mutation]
+            })
+        flat = [shared[index] for index in inverse.tolist()]
+
+        # group the notes by chord
+        bounds = np.flatnonzero(np.diff(self.notes["chord"], prepend=-1, append=-1)).tolist()
+        return [flat[start:end] for start, end in zip(bounds, bounds[1:])]
+
+def organum_to_arrays(organum: "list[list[list[dict]]]", rate: int = SAMPLE_RATE) -> "list[ScoreArray]":
+    """This converts every voice of an organum to a ScoreArray
+
+    Args:
+        organum (list): voices as returned by compile_score
+        rate (int, optional): sample rate of the timeline. Defaults to SAMPLE_RATE.
+
+    Returns:
+        list[ScoreArray]: columnar voices
+    """
+    return [ScoreArray.from_music(voice, rate) for voice in organum]
+
+def arrays_to_organum(arrays: "list[ScoreArray]") -> "list[list[list[dict]]]":
+    """This converts every ScoreArray back to the compiler's voices
+
+    Args:
+        arrays (list[ScoreArray]): columnar voices
+
+    Returns:
+        list: voices as returned by compile_score
+    """
+    return [array.to_music() for array in arrays]
@@ -0,0 +1,115 @@
+import numpy as np
+from functools import lru_cache
+from typing import Iterator
+from src.score import MUTATIONS, SYLLABLES
+
+# constants
+EQUAL, PYTHAGOREAN, JUST = "equal", "pythagorean", "just"
+TUNINGS = (EQUAL, PYTHAGOREAN, JUST)
+MIN_OCTAVE, MAX_OCTAVE = -8, 8
+
+# equal temperament on the hexachords' rounded base frequencies (the original tuning)
+TO_MUTATION = {
+    "G": 98,
+    "c": 130,
+    "f": 174,
+    "g": 196,
+    "c'": 262,
+    "f'": 349,
+    "g'": 392
+}
+TO_SEMITONE = {
+    "ut": 0,
+    "re": 2,
+    "mi": 4,
+    "fa": 5,
+    "sol": 7,
+    "la": 9
+}
+
+# pure tunings: each hexachord a chain of fourths and octaves above gamma ut, each step a ratio above ut
+GAMMA_UT = 98
+PURE_MUTATION = {
+    "G": 1,
+    "c": 4/3,
+    "f": 16/9,
+    "g": 2,
+    "c'": 8/3,
+    "f'": 32/9,
+    "g'": 4
+}
+PURE_RATIOS = {
+    PYTHAGOREAN: [1, 9/8, 81/64, 4/3, 3/2, 27/16], # whole tones of 9/8 and a 256/243 semitone
+    JUST: [1, 9/8, 5/4, 4/3, 3/2, 5/3]             # pure thirds and sixths
+}
+
+# indexes of the table, unknown syllables are ut and unknown mutations are c'
+SYLLABLE_INDEX = {syllable: index for index, syllable in enumerate(SYLLABLES)}
+MUTATION_INDEX = {mutation: index for index, mutation in enumerate(MUTATIONS)}
+DEFAULT_MUTATION = MUTATION_INDEX["c'"]
+
+@lru_cache(maxsize=None)
+def get_table(tuning: str = EQUAL) -> np.ndarray:
+    """This precomputes the frequency of every (mutation, syllable, octave) of a tuning
+
+    Args:
+        tuning (str, optional): one of TUNINGS. Defaults to EQUAL.
+
+    Returns:
+        np.ndarray: read only float64 table indexed by MUTATIONS, SYLLABLES and octave - MIN_OCTAVE
+    """
+    if tuning not in TUNINGS:
+        raise ValueError(f"unknown tuning {tuning!r}, expected one of {', '.join(TUNINGS)}")
+
+    if tuning == EQUAL:
+        steps = [[TO_MUTATION[mutation] * (2**(TO_SEMITONE[syllable]/12)) for syllable in SYLLABLES] for mutation in MUTATIONS]
+    else:
+        steps = [[GAMMA_UT * PURE_MUTATION[mutation] * ratio for ratio in PURE_RATIOS[tuning]] for mutation in MUTATIONS]
+
+    table = np.array(steps)[:, :, None] * 2.0 ** np.arange(MIN_OCTAVE, MAX_OCTAVE + 1)
+    table.flags.writeable = False
+    return table
+
+def frequencies(mutations: "list[int]", syllables: "list[int]", octaves: "list[int]", tuning: str = EQUAL) -> np.ndarray:
+    """This looks up the frequencies of many notes with one gather from the table
+
+    Args:
+        mutations (list[int]): indexes into MUTATIONS
+        syllables (list[int]): indexes into SYLLABLES
+        octaves (list[int]): octaves above the hexachord
+        tuning (str, optional): one of TUNINGS. Defaults to EQUAL.
+
+    Returns:
+        np.ndarray: frequency of each note
+    """
+    table = get_table(tuning)
+    octaves = np.asarray(octaves, dtype=np.int64)
+    index = np.clip(octaves - MIN_OCTAVE, 0, table.shape[2] - 1)
+
+    # octaves past the table are whole powers of two away from its edge
+    return np.ldexp(table[np.asarray(mutations, dtype=np.intp), np.asarray(syllables, dtype=np.intp), index], (octaves - MIN_OCTAVE - index).astype(np.int32))
+
+def frequency(note: str, octave: int, mutation: str, tuning: str = EQUAL) -> float:
+    """This gives the frequency of a single note as written in a score (octave and mutation may be None)"""
+    return float(frequencies([MUTATION_INDEX.get(mutation, DEFAULT_MUTATION)], [SYLLABLE_INDEX.get(note, 0)], [octave or 0], tuning)[0])
+
+def music_frequencies(music: "list[list[dict]]", tuning: str = EQUAL) -> "list[float]":
+    """This gives the frequency of every note (rests are skipped) of a voice's chords, in order
+
+    Args:
+        music (list[list[dict]]): chords of a voice as returned by compile_score
+        tuning (str, optional): one of TUNINGS. Defaults to EQUAL.
+
+    Returns:
+        list[float]: frequency of each note
+    """
+    notes = [note for chord in music for note in chord if note["type"] == "note"]
+    mutations = [MUTATION_INDEX.get(note["mutation"], DEFAULT_MUTATION) for note in notes]
+    syllables = [SYLLABLE_INDEX.get(note["note"].rstrip("+"), 0) for note in notes]
+    octaves = [note["octave"] or 0 for note in notes]
+    return frequencies(mutations, syllables, octaves, tuning).tolist()
+
+def iter_music_frequencies(music: "list[list[dict]]", tuning: str = EQUAL, batch: int = 4096) -> "Iterator[float]":
+    """This gives the frequencies of music_frequencies one batch of chords at a time, so a long voice can start playing at once"""
+    for start in range(0, len(music), batch):
+        yield from music_frequencies(music[start:start + batch], tuning)
@@ -0,0 +1,59 @@
+import customtkinter, os, threading
+from functools import lru_cache
+from PIL import Image
+
+# Initialize PATH for assets
+cd = os.path.dirname(os.path.abspath(__file__))
+cd_ = os.path.dirname(cd)
+cd__ = os.path.dirname(cd_)
+PATH = os.path.join(cd__, "assets")
+
+IMAGE_SIZE = (20, 20)
+DIRECTION_IMAGE_SIZE = (550, 650)
+PREWARM_MS = 250 # after the first frame
+
+# images of the windows opened later (Play and Help): (name, size it is decoded at or None)
+PREWARM = [
+    ("replay.png", IMAGE_SIZE),
+    ("stop.png", IMAGE_SIZE),
+    ("download.png", IMAGE_SIZE),
+    ("directions.png", None),
+    ("github.png", None),
+    ("download.png", None),
+    ("wiki.png", None),
+    ("paper.png", None)
+]
+
+# shared CTkImages: (name, size, resized) -> CTkImage
+ICONS = {}
+
+@lru_cache(maxsize=None)
+def load_image(name: str, size: tuple = None) -> Image.Image:
+    """This decodes an image of the assets folder once (resized when a size is given), safe to call from any thread"""
+    with Image.open(os.path.join(PATH, name)) as image:
+        return image.resize(size) if size else image.copy()
+
+def get_icon(name: str, size: tuple = IMAGE_SIZE, resize: bool = True) -> customtkinter.CTkImage:
+    """This gives the CTkImage of an asset shown at size, shared by every widget (create it on the Tk thread)
+
+    Args:
+        name (str): file name in the assets folder
+        size (tuple, optional): size it is shown at. Defaults to IMAGE_SIZE.
+        resize (bool, optional): resize the image once when decoding it instead of letting CTkImage scale it. Defaults to True.
+
+    Returns:
+        customtkinter.CTkImage: the shared image
+    """
+    key = (name, size, resize)
+    icon = ICONS.get(key)
+    if icon is None:
+        icon = ICONS[key] = customtkinter.CTkImage(load_image(name, size if resize else None), size=size)
+    return icon
+
+def prewarm(widget, images: "list[tuple]" = PREWARM) -> None:
+    """This decodes the images of the windows opened later on a background thread once the first frame is drawn"""
+    def decode():
+        for name, size in images:
+            load_image(name, size)
+
+    widget.after(PREWARM_MS, lambda: threading.Thread(target=decode, name="organum-assets", daemon=True).start())
@@ -1,4 +1,12 @@
-import customtkinter, platform
+import customtkinter, logging, platform
+from src.autosave import AUTOSAVE_MS, AutosaveWriter
+from src.player import AUDIO_CACHE, position
+
+FOLLOW_MS = 33 # about 30 highlights per second while a score plays
+PLAYING_TAG = "playing"
+PLAYING_COLOR = "#1f6aa5"
+LOAD_CHUNK = 1 << 18 # characters inserted per step while a file loads
+LOAD_MS = 1 # pause between steps, so Tk redraws and handles input while a large file loads
 
 class FileTabs(customtkinter.CTkTabview):
     def __init__(self, master, **kwargs):
@@ -7,12 +15,20 @@ class FileTabs(customtkinter.CTkTabview):
         # create storage
         self.tabs = {}
         self.tabs_line_numbers = {}
+        self.follow_id = None
+
+        # files are saved in the background once typing pauses (see src/autosave.py)
+        self.writer = AutosaveWriter()
+        self.autosave_ids = {}
+
+        # files still being inserted into their tab, a step at a time
+        self.loading = {}
 
         # add the initial empty page
         if not self.tabs.keys():
             self.add_tab("None", None, True)
 
-    def add_tab(self, file_name: str, file_path: str, empty=False):
+    def add_tab(self, file_name: str, file_path: str, empty=False, read_only=False):
         # check if file_name is already in use
         if file_name in self.tabs.keys() or file_path in self.tabs.values():
             return
@@ -36,21 +52,32 @@ class FileTabs(customtkinter.CTkTabview):
         else:
             # add tab to dict and load file
             self.tabs[file_name] = file_path
-            self.load_file(tab, file_name, file_path)
+            self.load_file(tab, file_name, file_path, read_only)
 
             # check if empty tag still exists
             if "None" in self.tabs.keys():
                 self.close_tab("None")
     
     def close_tab(self, tab_name: str):
+        # a file still loading was never edited, so there is nothing to save
+        self.cancel_loading(tab_name)
+
+        # save what was typed since the last autosave before the tab is gone
+        file_path = self.tabs[tab_name]
+        if file_path is not None:
+            self.autosave(tab_name, file_path)
+            self.writer.flush(file_path)
+
+        AUDIO_CACHE.discard(file_path)
         self.delete(tab_name)
         del self.tabs[tab_name]
+        self.tabs_line_numbers.pop(tab_name, None) # a reopened tab starts with an empty gutter
 
         if not self.tabs.keys():
             # self.empty_tab()
             self.add_tab("None", None, True)
 
-    def load_file(self, tab: customtkinter.CTkFrame, tab_name: str, file_path: str):
+    def load_file(self, tab: customtkinter.CTkFrame, tab_name: str, file_path: str, read_only=False):
         # initialize
         tab.grid_columnconfigure(0, weight=0)
         tab.grid_columnconfigure(1, weight=1)
@@ -70,16 +97,12 @@ class FileTabs(customtkinter.CTkTabview):
             undo=True
         )
         tab.textbox.grid(row=0, column=1, sticky="nsew")
-
-        # dump file
-        with open(file_path, "r") as FILE:
-            file = FILE.read()
-            line_count = file.count("\n")
-        tab.textbox.insert("0.0", file)
+        tab.textbox.tag_config(PLAYING_TAG, background=PLAYING_COLOR)
 
         # bind to textbox
-        tab.textbox.bind("<KeyRelease>", lambda event: self.autosave(tab_name, file_path))
+        tab.textbox.bind("<KeyRelease>", lambda event: self.schedule_autosave(tab_name, file_path))
         tab.textbox.bind("<Tab>", lambda event: self.custom_tab(tab_name))
+        tab.textbox.bind("<Command-Return>", lambda event: self.master.my_frame.listen_play_from_cursor()) # play from the cursor
 
         # make scroll frame for line numbers
         tab.line_numbers = customtkinter.CTkTextbox(
@@ -89,7 +112,6 @@ class FileTabs(customtkinter.CTkTabview):
             activate_scrollbars=False
         )
         tab.line_numbers.grid(row=0, column=0, sticky="nsew")
-        self.update_line_numbers(tab_name, line_count)
 
         # create scroll bar for the text boxes
         def control_scrollbar(*args):
@@ -105,32 +127,159 @@ class FileTabs(customtkinter.CTkTabview):
         tab.textbox.bind("<MouseWheel>", lambda event: self.on_mousewheel(event, tab))
         tab.line_numbers.bind("<MouseWheel>", lambda event: self.on_mousewheel(event, tab))
 
-    def autosave(self, tab_name: str, file_path: str):
-        text = self.tab(tab_name).textbox.get("0.0", "end")
+        # dump file (the first screen shows at once, the rest is inserted in steps and can not be edited until it is all in)
+        tab.textbox.configure(state="disabled")
+        self.loading[tab_name] = {
+            "file": open(file_path, "r"),
+            "file_path": file_path,
+            "parts": [],
+            "read_only": read_only,
+            "after_id": None
+        }
+        self.update_line_numbers(tab_name, 1)
+        self.load_chunk(tab_name)
 
-        # save the text to the file
-        with open(file_path, "w") as FILE:
-            FILE.write(text)
-            
-        line_count = text.count("\n")
+    def load_chunk(self, tab_name: str, size: int = LOAD_CHUNK):
+        loading = self.loading[tab_name]
+        loading["after_id"] = None
+        textbox = self.tab(tab_name).textbox
+
+        try:
+            text = loading["file"].read(size)
+        except (OSError, UnicodeDecodeError) as error:
+            # the tab keeps what was read, read-only so the partial file is never saved over the real one
+            self.cancel_loading(tab_name)
+            logging.error(f"could not load {loading['file_path']}: {error}")
+            return
+
+        if text:
+            loading["parts"].append(text)
+            textbox.configure(state="normal")
+            textbox.insert("end-1c", text)
+            textbox.configure(state="disabled")
+            textbox.edit_modified(False)
+            self.update_line_numbers(tab_name, int(textbox.index("end-1c").split(".")[0]))
+
+        # more to come
+        if size > 0 and len(text) == size:
+            loading["after_id"] = self.after(LOAD_MS, lambda: self.load_chunk(tab_name))
+            return
+
+        # loaded
+        del self.loading[tab_name]
+        loading["file"].close()
+        if not loading["read_only"]:
+            textbox.configure(state="normal")
+        textbox.edit_reset() # loading the file can not be undone
+        textbox.edit_modified(False)
+        self.writer.remember(loading["file_path"], "".join(loading["parts"]))
+
+    def finish_loading(self, tab_name: str):
+        # inserts the rest of a file at once (ex. before its score is compiled)
+        loading = self.loading.get(tab_name)
+        if loading is None:
+            return
+        if loading["after_id"] is not None:
+            self.after_cancel(loading["after_id"])
+        self.load_chunk(tab_name, -1)
+
+    def cancel_loading(self, tab_name: str):
+        loading = self.loading.pop(tab_name, None)
+        if loading is None:
+            return
+        if loading["after_id"] is not None:
+            self.after_cancel(loading["after_id"])
+        loading["file"].close()
 
+    def schedule_autosave(self, tab_name: str, file_path: str):
+        textbox = self.tab(tab_name).textbox
+
+        # the line numbers follow every key (the line count is read from the index, not the text)
+        line_count = int(textbox.index("end-1c").split(".")[0])
         if line_count != self.tabs_line_numbers[tab_name]:
             self.update_line_numbers(tab_name, line_count)
 
+        # keys that did not edit (ex. arrows) save nothing, edits save once typing pauses for AUTOSAVE_MS
+        if not textbox.edit_modified():
+            return
+        if tab_name in self.autosave_ids:
+            self.after_cancel(self.autosave_ids[tab_name])
+        self.autosave_ids[tab_name] = self.after(AUTOSAVE_MS, lambda: self.autosave(tab_name, file_path))
+
+    def autosave(self, tab_name: str, file_path: str):
+        after_id = self.autosave_ids.pop(tab_name, None)
+        if after_id is not None:
+            self.after_cancel(after_id)
+
+        textbox = self.tab(tab_name).textbox
+        if not textbox.edit_modified():
+            return
+
+        # snapshot the text, the writer saves it to the file in the background
+        self.writer.save(file_path, textbox.get("1.0", "end-1c"))
+
+        # the score changed, so its render can not be replayed
+        AUDIO_CACHE.discard(file_path)
+        textbox.edit_modified(False)
+
+    def flush_autosaves(self):
+        # saves every open file (ex. when the app closes)
+        for tab_name, file_path in self.tabs.items():
+            if file_path is not None:
+                self.autosave(tab_name, file_path)
+        self.writer.flush()
+
     def update_line_numbers(self, tab_name: str, line_numbers: int):
-        # get tab and number of lines
+        # get tab and number of lines shown
         tab_reference = self.tab(tab_name)
-        line_nums = [str(x) for x in range(1, line_numbers+1)]
+        shown = self.tabs_line_numbers.get(tab_name, 0)
 
-        # update line numbers
+        # only the trailing numbers that changed are added or removed, so an edit costs the same in any file size
         tab_reference.line_numbers.configure(state="normal")
-        tab_reference.line_numbers.delete("0.0", "end")
-        tab_reference.line_numbers.insert("0.0", ("\n".join(line_nums)))
+        if line_numbers > shown:
+            line_nums = "\n".join(str(x) for x in range(shown + 1, line_numbers + 1))
+            tab_reference.line_numbers.insert("end-1c", "\n" + line_nums if shown else line_nums)
+        elif line_numbers < shown:
+            tab_reference.line_numbers.delete(f"{line_numbers}.end" if line_numbers else "1.0", "end-1c")
         tab_reference.line_numbers.configure(state="disabled")
 
         # update reference
         self.tabs_line_numbers[tab_name] = line_numbers
     
+    def follow_playback(self, tab_name: str, index):
+        # stop following the previous playback
+        if self.follow_id is not None:
+            self.after_cancel(self.follow_id)
+            self.follow_id = None
+        if tab_name not in self.tabs or self.tabs[tab_name] is None:
+            return
+        textbox = self.tab(tab_name).textbox
+        spans = []
+
+        # highlight the notes sounding in every voice (see SourceIndex.sounding), only touching the text when they change
+        def follow():
+            nonlocal spans
+            if not textbox.winfo_exists():
+                self.follow_id = None
+                return
+
+            frame = position()
+            sounding = index.sounding(frame) if frame is not None else []
+            if sounding != spans:
+                for line, column, end_line, end_column in spans:
+                    textbox.tag_remove(PLAYING_TAG, f"{line}.{column}", f"{end_line}.{end_column}")
+                for line, column, end_line, end_column in sounding:
+                    textbox.tag_add(PLAYING_TAG, f"{line}.{column}", f"{end_line}.{end_column}")
+                spans = sounding
+
+            # the playback ended or was stopped
+            if frame is None:
+                self.follow_id = None
+                return
+            self.follow_id = self.after(FOLLOW_MS, follow)
+
+        follow()
+
     def custom_tab(self, tab_name: str):
         # insert tab
         self.tab(tab_name).textbox.insert("insert", " " * 4)
@@ -1,16 +1,8 @@
-import customtkinter, os, webbrowser
-from PIL import Image
-
-# Initialize PATH for assets
-cd = os.path.dirname(os.path.abspath(__file__))
-cd_ = os.path.dirname(cd)
-cd__ = os.path.dirname(cd_)
-PATH = os.path.join(cd__, "assets")
+import customtkinter, webbrowser
+from src.views.assets import DIRECTION_IMAGE_SIZE, PATH, get_icon
 
 BUTTON_WIDTH = 140
 BUTTON_PADDING = 5
-IMAGE_SIZE = (20, 20)
-DIRECTION_IMAGE_SIZE = (550, 650)
 
 GITHUB = "https://github.com/drjonah/MU3100-Final-Project"
 WIKI = "https://en.wikipedia.org/wiki/Guidonian_hand"
@@ -29,12 +21,12 @@ class HelpInformation(customtkinter.CTkToplevel):
         self.grid_columnconfigure(2, weight=1)
         self.grid_columnconfigure(3, weight=1)
 
-        # images
-        self.img_github = customtkinter.CTkImage(Image.open(f"{PATH}/github.png"))
-        self.img_download = customtkinter.CTkImage(Image.open(f"{PATH}/download.png"))
-        self.img_wiki = customtkinter.CTkImage(Image.open(f"{PATH}/wiki.png"))
-        self.img_paper = customtkinter.CTkImage(Image.open(f"{PATH}/paper.png"))
-        self.img_help = customtkinter.CTkImage(Image.open(f"{PATH}/directions.png"), size=DIRECTION_IMAGE_SIZE)
+        # images (decoded once and shared, see src/views/assets.py)
+        self.img_github = get_icon("github.png", resize=False)
+        self.img_download = get_icon("download.png", resize=False)
+        self.img_wiki = get_icon("wiki.png", resize=False)
+        self.img_paper = get_icon("paper.png", resize=False)
+        self.img_help = get_icon("directions.png", DIRECTION_IMAGE_SIZE, resize=False)
 
         # example
         self.example_file_name = "example"
@@ -89,9 +81,14 @@ class HelpInformation(customtkinter.CTkToplevel):
         )
         self.download_button.grid(row=1, column=3, padx=BUTTON_PADDING, pady=BUTTON_PADDING)
 
-        # escape key
-        self.bind("<Escape>", lambda event: self.destroy())
+        # escape key and close button hide the window so it opens again at once
+        self.bind("<Escape>", lambda event: self.withdraw())
+        self.protocol("WM_DELETE_WINDOW", self.withdraw)
+
+    def show(self):
+        self.deiconify()
+        self.lift()
+        self.focus()
 
     def open_example(self):
-        self.master.tab_view.add_tab(self.example_file_name, self.example_file_path)
-        self.master.tab_view.tab(self.example_file_name).textbox.configure(state="disabled")
+        self.master.tab_view.add_tab(self.example_file_name, self.example_file_path, read_only=True)
@@ -1,49 +1,165 @@
-import customtkinter, os
-from PIL import Image
-from src.player import play, stop
-
-# Initialize PATH for assets
-cd = os.path.dirname(os.path.abspath(__file__))
-cd_ = os.path.dirname(cd)
-cd__ = os.path.dirname(cd_)
-PATH = os.path.join(cd__, "assets")
+import customtkinter, logging, os
+from tkinter.filedialog import asksaveasfilename
+from src.player import export, play, stop
+from src.views.assets import get_icon
 
 BUTTON_WIDTH = 130
 BUTTON_PADDING = 5
-IMAGE_SIZE = (20, 20)
+PLAY_JOB, EXPORT_JOB = "play", "export" # a job only supersedes the job of its kind
 
 class ScoreInformation(customtkinter.CTkToplevel):
-    def __init__(self, *args, **kwargs):
+    def __init__(self, *args, worker=None, **kwargs):
         super().__init__(*args, **kwargs)
-        self.geometry("300x120")
+        self.geometry("300x200")
         self.title("Guido's Organum | MU 3100")
         self.resizable(False, False)
+        self.grid_columnconfigure(0, weight=1)
 
-        self.img_replay = customtkinter.CTkImage(Image.open(f"{PATH}/replay.png").resize(IMAGE_SIZE))
-        self.img_stop = customtkinter.CTkImage(Image.open(f"{PATH}/stop.png").resize(IMAGE_SIZE))
+        self.img_replay = get_icon("replay.png")
+        self.img_stop = get_icon("stop.png")
+        self.img_export = get_icon("download.png")
 
-        # escape key
-        self.bind('<Escape>', lambda event: self.destroy())
+        # background compile and render jobs by kind (see src/worker.py), and the one the progress bar shows
+        self.worker = worker
+        self.jobs = {} # kind -> (job, determinate)
+        self.progress_job = None
+        self.opened = False
 
-    def open_score(self, file_data: dict, organum: list):
-        self.grid_columnconfigure(0, weight=1)
+        # score being shown: (file_data, organum, context, key, source, on_play), its widgets are built with the first one
+        self.score = None
+        self.title_label = None
 
-        score_title = file_data["title"] if file_data["title"] != "" else "Unknown Title"
-        score_composer = file_data["composer"] if file_data["composer"] != "" else "Unknown Composer"
+        self.progress_bar = customtkinter.CTkProgressBar(
+            master=self,
+            width=BUTTON_WIDTH * 2 - 80
+        )
+        self.cancel_button = customtkinter.CTkButton(
+            master=self,
+            text="Cancel",
+            width=80,
+            command=self.cancel_progress
+        )
+        self.status_label = customtkinter.CTkLabel(
+            master=self,
+            text=""
+        )
+
+        # escape key and close button hide the window, the next play reuses it
+        self.bind('<Escape>', lambda event: self.close())
+        self.protocol("WM_DELETE_WINDOW", self.close)
+
+    def run(self, task, on_done, kind: str = PLAY_JOB, determinate: bool = True, on_error=None, on_cancel=None):
+        """Runs task(job) on the worker with a progress bar and a cancel button, then on_done(result) on the Tk thread.
+        The job supersedes the window's job of the same kind only."""
+        job = None
+
+        # a newer job of the kind owns its slot, so a superseded job touches nothing
+        def finish() -> bool:
+            if self.jobs.get(kind, (None,))[0] is not job:
+                return False
+            del self.jobs[kind]
+            self.hide_progress(job)
+            return True
+
+        def done(result):
+            if finish():
+                on_done(result)
+
+        def failed(error):
+            if finish():
+                logging.error(error)
+                if on_error is not None:
+                    on_error(error)
+
+        def cancelled(_):
+            if not finish():
+                return
+            if on_cancel is not None:
+                on_cancel()
+            # play cancelled before a score was opened
+            if kind == PLAY_JOB and not self.opened and self.winfo_exists():
+                self.withdraw()
+
+        job = self.worker.submit(task, done, lambda fraction: self.update_progress(job, fraction), failed, cancelled, kind)
+        self.jobs[kind] = (job, determinate)
+        self.show_progress(job, determinate)
+
+    def show_progress(self, job, determinate: bool):
+        self.progress_job = job
+        if not self.winfo_exists():
+            return
+        self.status_label.grid_forget()
+        self.progress_bar.stop()
+        self.progress_bar.configure(mode="determinate" if determinate else "indeterminate")
+        self.progress_bar.set(0)
+        self.progress_bar.grid(row=4, column=0, padx=BUTTON_PADDING, pady=BUTTON_PADDING, sticky="e")
+        self.cancel_button.grid(row=4, column=1, padx=BUTTON_PADDING, pady=BUTTON_PADDING, sticky="w")
+        if not determinate:
+            self.progress_bar.start()
+
+    def update_progress(self, job, fraction: float):
+        if self.progress_job is job:
+            self.progress_bar.set(fraction)
+
+    def hide_progress(self, job):
+        # the bar goes over to a job still running (ex. an export after its play compiled)
+        if self.progress_job is not job:
+            return
+        self.progress_job = None
+        for other, determinate in self.jobs.values():
+            self.show_progress(other, determinate)
+            return
+        if not self.winfo_exists():
+            return
+        self.progress_bar.stop()
+        self.progress_bar.grid_forget()
+        self.cancel_button.grid_forget()
 
-        self.title = customtkinter.CTkLabel(
+    def show_status(self, text: str):
+        # shown where the progress bar is while no job runs
+        if not self.winfo_exists() or self.progress_job is not None:
+            return
+        self.status_label.configure(text=text)
+        self.status_label.grid(row=4, column=0, columnspan=2, padx=BUTTON_PADDING, pady=BUTTON_PADDING)
+
+    def cancel_job(self, kind: str):
+        job = self.jobs.get(kind, (None,))[0]
+        if job is not None:
+            job.cancel()
+
+    def cancel_progress(self):
+        # the cancel button stops the job it shows the progress of
+        if self.progress_job is not None:
+            self.progress_job.cancel()
+
+    def cancel(self):
+        # stops the play being compiled and the playback, an export keeps going until its own cancel
+        self.cancel_job(PLAY_JOB)
+        stop()
+
+    def show(self):
+        self.deiconify()
+        self.lift()
+        self.focus()
+
+    def close(self):
+        self.cancel_job(PLAY_JOB)
+        self.withdraw()
+
+    def build(self):
+        self.title_label = customtkinter.CTkLabel(
             master=self,
-            text=score_title
+            text=""
         )
-        self.title.grid(row=0, column=0, columnspan=2, sticky="nsew", padx=BUTTON_PADDING, pady=BUTTON_PADDING)
-        self.title.cget("font").configure(size=18)
+        self.title_label.grid(row=0, column=0, columnspan=2, sticky="nsew", padx=BUTTON_PADDING, pady=BUTTON_PADDING)
+        self.title_label.cget("font").configure(size=18)
 
-        self.composer = customtkinter.CTkLabel(
+        self.composer_label = customtkinter.CTkLabel(
             master=self,
-            text=score_composer
+            text=""
         )
-        self.composer.grid(row=1, column=0, columnspan=2, sticky="nsew", padx=BUTTON_PADDING, pady=BUTTON_PADDING)
-        self.composer.cget("font").configure(size=12)
+        self.composer_label.grid(row=1, column=0, columnspan=2, sticky="nsew", padx=BUTTON_PADDING, pady=BUTTON_PADDING)
+        self.composer_label.cget("font").configure(size=12)
 
         self.replay_button = customtkinter.CTkButton(
             master=self,
@@ -51,7 +167,7 @@ class ScoreInformation(customtkinter.CTkToplevel):
             width=BUTTON_WIDTH,
             image=self.img_replay,
             compound="left",
-            command=lambda: play(organum)
+            command=self.replay
         )
         self.replay_button.grid(row=2, column=0, padx=BUTTON_PADDING, pady=BUTTON_PADDING)
 
@@ -61,10 +177,67 @@ class ScoreInformation(customtkinter.CTkToplevel):
             width=BUTTON_WIDTH,
             image=self.img_stop,
             compound="left",
-            command=lambda: stop()
+            command=self.cancel
         )
         self.stop_button.grid(row=2, column=1, padx=BUTTON_PADDING, pady=BUTTON_PADDING)
 
+        self.export_button = customtkinter.CTkButton(
+            master=self,
+            text="Export",
+            width=BUTTON_WIDTH * 2 + BUTTON_PADDING * 2,
+            image=self.img_export,
+            compound="left",
+            command=self.export_score
+        )
+        self.export_button.grid(row=3, column=0, columnspan=2, padx=BUTTON_PADDING, pady=BUTTON_PADDING)
+
         # bind key
-        self.bind("<Command-p>", lambda event: play(organum))
-        self.bind("<Command-s>", lambda event: stop())
\ No newline at end of file
+        self.bind("<Command-p>", lambda event: self.replay())
+        self.bind("<Command-s>", lambda event: self.cancel())
+
+    def open_score(self, file_data: dict, organum: list, context=None, key: str = None, source: str = None, on_play=None):
+        self.opened = True
+        if self.title_label is None:
+            self.build()
+        self.score = (file_data, organum, context, key, source, on_play)
+
+        score_title = file_data["title"] if file_data["title"] != "" else "Unknown Title"
+        score_composer = file_data["composer"] if file_data["composer"] != "" else "Unknown Composer"
+        self.title_label.configure(text=score_title)
+        self.composer_label.configure(text=score_composer)
+
+    def replay(self):
+        if self.score is None:
+            return
+        file_data, organum, context, key, source, on_play = self.score
+        play(organum, context=context, tuning=file_data["tuning"], key=key, source=source)
+        if on_play is not None:
+            on_play()
+
+    def export_score(self):
+        if self.score is None:
+            return None
+        file_data, organum = self.score[:2]
+        score_title = self.title_label.cget("text")
+
+        # find file location
+        file_path = asksaveasfilename(
+            parent=self,
+            initialfile=f"{score_title}.wav",
+            defaultextension=".wav",
+            filetypes=[("WAV", "*.wav"), ("FLAC", "*.flac")]
+        )
+
+        # cancel export action
+        if not file_path:
+            return None
+
+        # rendered on the worker, so the window keeps responding and playing
+        file_name = os.path.basename(file_path)
+        self.run(
+            lambda job: export(organum, file_path, tuning=file_data["tuning"], progress=job.progress),
+            lambda samples: self.show_status(f"Exported {file_name}"),
+            EXPORT_JOB,
+            on_error=lambda error: self.show_status(f"Export failed: {error}"),
+            on_cancel=lambda: self.show_status("Export cancelled")
+        )
@@ -1,20 +1,15 @@
 import customtkinter, os
-from PIL import Image
 from tkinter.filedialog import askopenfilename, askdirectory
-from src.compiler import compile_score
-from src.player import play
+from src.cache import cache_key
+from src.compiler import COMPILER_VERSION, compile_text
+from src.player import FINAL_CONTEXT, PREVIEW_CONTEXT, SourceIndex, play
+from src.views.assets import get_icon
 from src.views.scoreInformation import ScoreInformation
 from src.views.helpInformation import HelpInformation
 
-# Initialize PATH for assets
-cd = os.path.dirname(os.path.abspath(__file__))
-cd_ = os.path.dirname(cd)
-cd__ = os.path.dirname(cd_)
-PATH = os.path.join(cd__, "assets")
-
 BUTTON_WIDTH = 140
 BUTTON_PADDING = 5
-IMAGE_SIZE = (20, 20)
+INDEX_JOB = "index" # indexing for the highlighting runs beside play compiles and exports
 
 class UtilBar(customtkinter.CTkFrame):
     def __init__(self, master, **kwargs):
@@ -28,11 +23,11 @@ class UtilBar(customtkinter.CTkFrame):
         self.grid_columnconfigure(4, weight=1)
 
         # Initialize images
-        self.img_play = customtkinter.CTkImage(Image.open(f"{PATH}/play.png").resize(IMAGE_SIZE))
-        self.img_new = customtkinter.CTkImage(Image.open(f"{PATH}/new.png").resize(IMAGE_SIZE))
-        self.img_open = customtkinter.CTkImage(Image.open(f"{PATH}/open.png").resize(IMAGE_SIZE))
-        self.img_close = customtkinter.CTkImage(Image.open(f"{PATH}/close.png").resize(IMAGE_SIZE))
-        self.img_help = customtkinter.CTkImage(Image.open(f"{PATH}/help.png").resize(IMAGE_SIZE))
+        self.img_play = get_icon("play.png")
+        self.img_new = get_icon("new.png")
+        self.img_open = get_icon("open.png")
+        self.img_close = get_icon("close.png")
+        self.img_help = get_icon("help.png")
 
         # Initialize buttons with images
         # play button
@@ -92,22 +87,100 @@ class UtilBar(customtkinter.CTkFrame):
 
         # bind key
         self.master.bind("<Command-p>", lambda event: self.listen_play())
+        self.master.bind("<Command-P>", lambda event: self.listen_play(PREVIEW_CONTEXT)) # quick low quality preview
         self.master.bind("<Command-n>", lambda event: self.listen_new_file())
         self.master.bind("<Command-o>", lambda event: self.listen_open_file())
         self.master.bind("<Command-h>", lambda event: self.listen_help_tab())
         self.master.bind("<Command-c>", lambda event: self.listen_close_tab())
 
-    def listen_play(self):
+        # (key, rate, SourceIndex) of the last score played, and (key, rate) of the score being indexed
+        self.source_index = None
+        self.indexing = None
+
+        # windows are built when first opened and then reused
+        self.score_information = None
+        self.help_information = None
+
+    def listen_play(self, context=None, cursor=None):
         tab_name = self.master.tab_view.get()
         file_path = self.master.tab_view.tabs[tab_name]
 
         if file_path is None:
             return 
         
-        file_data, organum = compile_score(file_path)
-        ScoreInformation().open_score(file_data, organum)
-        # waits for the window to open before play
-        self.after(100, lambda: play(organum))
+        # a large file may still be loading, the score is the whole file
+        self.master.tab_view.finish_loading(tab_name)
+        text = self.master.tab_view.tab(tab_name).textbox.get("0.0", "end")
+        key = cache_key(text, COMPILER_VERSION)
+        window = self.get_score_information()
+
+        rate = (context or FINAL_CONTEXT).rate
+
+        # compile the editor's buffer (unchanged voices are reused) and, to play from the cursor, index where its chords start
+        def compile_score(job):
+            positions = []
+            file_data, organum = compile_text(text, positions, job.check)
+            index = self.cached_index(key, rate)
+            if index is None and cursor is not None:
+                index = SourceIndex(organum, positions, rate)
+            return file_data, organum, positions, index
+
+        # playback is streamed, so it starts at once without blocking
+        def open_score(result):
+            file_data, organum, positions, index = result
+            follow = lambda: self.follow_playback(tab_name, key, rate, organum, positions, index)
+            window.open_score(file_data, organum, context, key, file_path, on_play=follow)
+
+            start = index.sample(*cursor) if cursor is not None else 0
+            play(organum, context=context, tuning=file_data["tuning"], key=key, source=file_path, start=start, index=index)
+            follow()
+
+        # compiled on the worker, a new play supersedes it
+        window.run(compile_score, open_score, determinate=False)
+
+    def get_score_information(self) -> ScoreInformation:
+        if self.score_information is None or not self.score_information.winfo_exists():
+            self.score_information = ScoreInformation(worker=self.master.worker)
+        else:
+            self.score_information.show()
+        return self.score_information
+
+    def cached_index(self, key: str, rate: int):
+        if self.source_index is not None and self.source_index[:2] == (key, rate):
+            return self.source_index[2]
+        return None
+
+    def follow_playback(self, tab_name: str, key: str, rate: int, organum: list, positions: list, index=None):
+        # highlights the sounding notes in the editor, indexing a new score on its own worker thread while it already plays
+        index = index or self.cached_index(key, rate)
+        if index is not None:
+            self.source_index = (key, rate, index)
+            self.master.tab_view.follow_playback(tab_name, index)
+            return
+        if self.indexing == (key, rate):
+            return
+
+        # only indexing another score supersedes it, so play compiles and exports never stop the highlighting
+        def indexed(index):
+            stopped(None)
+            self.follow_playback(tab_name, key, rate, organum, positions, index)
+
+        def stopped(_):
+            if self.indexing == (key, rate):
+                self.indexing = None
+
+        self.indexing = (key, rate)
+        self.master.worker.submit(lambda job: SourceIndex(organum, positions, rate), indexed, None, stopped, stopped, INDEX_JOB)
+
+    def listen_play_from_cursor(self):
+        tab_name = self.master.tab_view.get()
+        if self.master.tab_view.tabs.get(tab_name) is None:
+            return "break"
+
+        # Tk indexes are "line.column"
+        line, column = self.master.tab_view.tab(tab_name).textbox.index("insert").split(".")
+        self.listen_play(cursor=(int(line), int(column)))
+        return "break"
 
     def listen_new_file(self):
         # open window to get file name
@@ -162,8 +235,8 @@ class UtilBar(customtkinter.CTkFrame):
         self.master.tab_view.close_tab(self.master.tab_view.get())
 
     def listen_help_tab(self):
-        if not hasattr(self, 'help_information') or not self.help_information or not self.help_information.winfo_exists():
+        if self.help_information is None or not self.help_information.winfo_exists():
             self.help_information = HelpInformation()
         else:
-            self.help_information.focus()
+            self.help_information.show()
             
@@ -0,0 +1,104 @@
+import queue, threading
+
+# constants
+POLL_MS = 30 # how often results are handed back to Tk
+
+class Cancelled(Exception):
+    """This is raised inside a job's task once the job is cancelled or superseded"""
+
+class Job:
+    """This is a task for the Worker. Its progress and cancel flag are shared between the worker thread and Tk"""
+    def __init__(self, worker: "Worker", task, on_done=None, on_progress=None, on_error=None, on_cancel=None, kind: str = None):
+        self.worker = worker
+        self.task = task
+        self.kind = kind
+        self.on_done = on_done
+        self.on_progress = on_progress
+        self.on_error = on_error
+        self.on_cancel = on_cancel
+        self.cancelled = threading.Event()
+
+    def cancel(self) -> None:
+        if not self.cancelled.is_set():
+            self.cancelled.set()
+            self.worker.results.put((self, "cancel", None))
+
+    def check(self) -> None:
+        """This stops the task once the job is cancelled (call it from the worker thread between steps)"""
+        if self.cancelled.is_set():
+            raise Cancelled
+
+    def progress(self, fraction: float) -> None:
+        """This reports the task's progress (0 to 1) from the worker thread and stops the task once the job is cancelled"""
+        self.check()
+        self.worker.results.put((self, "progress", fraction))
+
+class Worker:
+    """This runs compile and render jobs on background threads, so the Tk main loop never blocks.
+    Jobs of a kind (ex. play compiles, exports) run one at a time on their own thread, and a new job only supersedes
+    the one of its kind in flight. Results are handed back on the Tk thread through after()."""
+    def __init__(self, widget):
+        self.widget = widget
+        self.lanes = {} # kind -> queue of jobs, each with its own thread
+        self.results = queue.Queue()
+        self.current = {} # kind -> job in flight
+
+        self.widget.after(POLL_MS, self.poll)
+
+    def submit(self, task, on_done=None, on_progress=None, on_error=None, on_cancel=None, kind: str = "job") -> Job:
+        """This runs task(job) on the worker thread of its kind and calls on_done(result) on the Tk thread.
+        on_progress(fraction), on_error(error) and on_cancel(None) are also called on the Tk thread.
+
+        Returns:
+            Job: the job, cancel() it to stop the task at its next progress report
+        """
+        self.cancel(kind)
+        job = self.current[kind] = Job(self, task, on_done, on_progress, on_error, on_cancel, kind)
+        self.lane(kind).put(job)
+        return job
+
+    def cancel(self, kind: str = "job") -> None:
+        """This cancels the job of a kind in flight"""
+        job = self.current.pop(kind, None)
+        if job is not None:
+            job.cancel()
+
+    def lane(self, kind: str) -> queue.Queue:
+        jobs = self.lanes.get(kind)
+        if jobs is None:
+            jobs = self.lanes[kind] = queue.Queue()
+            threading.Thread(target=self.run, args=(jobs,), name=f"organum-worker-{kind}", daemon=True).start()
+        return jobs
+
+    def run(self, jobs: queue.Queue) -> None:
+        while True:
+            job = jobs.get()
+            if job.cancelled.is_set():
+                continue
+
+            try:
+                result = job.task(job)
+            except Cancelled:
+                continue
+            except Exception as error:
+                self.results.put((job, "error", error))
+                continue
+            self.results.put((job, "done", result))
+
+    def poll(self) -> None:
+        self.widget.after(POLL_MS, self.poll)
+
+        # hand the results over on the Tk thread (results of cancelled jobs are dropped)
+        while True:
+            try:
+                job, kind, value = self.results.get_nowait()
+            except queue.Empty:
+                break
+            if job.cancelled.is_set() and kind != "cancel":
+                continue
+            if kind in ("done", "error") and self.current.get(job.kind) is job:
+                del self.current[job.kind]
+
+            callback = getattr(job, f"on_{kind}")
+            if callback is not None:
+                callback(value)